@@ -0,0 +1,208 @@
+"""
+Async versions of the auth and admin endpoints.
+
+Enabled with ASYNC_API=true. The handlers run on the event loop with an
+AsyncSession, so an in-flight request no longer pins a threadpool thread;
+password hashing still goes to the dedicated hashing executor.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import schemas
+import auth
+import pagination
+import sessions
+import stats
+import database
+import metrics
+from database import get_async_db, User
+from hashing import hasher
+from user_cache import user_cache
+from login_tracker import last_login_buffer
+from rate_limit import rate_limiter, client_ip
+
+# This router is included ahead of the sync routes, so it must not declare a
+# GET /admin/users/{user_id}: it would shadow /admin/users/export and friends
+router = APIRouter()
+
+security = HTTPBearer()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    username = auth.verify_token(token)
+    if username is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = user_cache.get(username, token)
+    if user is not None:
+        return user
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    user_cache.set(username, token, user)
+    return user
+
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if auth.AUTH_MODE == "claims":
+        payload = auth.decode_token(credentials.credentials)
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = auth.principal_from_claims(payload)
+        if principal is not None:
+            if not principal.is_active:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+            return principal
+    return await get_current_user(credentials)
+
+async def get_current_admin_user(current_user: User = Depends(get_current_principal)):
+    if current_user.role == auth.ROLE_ADMIN:
+        return current_user
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not enough permissions. Admin access required."
+    )
+
+async def _get_user_or_404(db: AsyncSession, user_id: int) -> User:
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@router.post("/signup", response_model=schemas.UserResponseExtended)
+async def signup(request: Request, user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    await rate_limiter.check_signup_async(client_ip(request))
+    result = await db.execute(
+        select(User.id).where((User.username == user.username) | (User.email == user.email)).limit(1)
+    )
+    if result.first():
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+
+    hashed_password = await hasher.hash_async(user.password)
+    db_user = User(
+        username=user.username,
+        email=user.email,
+        hashed_password=hashed_password,
+        auth_provider="local"
+    )
+    db.add(db_user)
+    await db.run_sync(lambda session: stats.user_added(session, auth_provider="local"))
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@router.post("/login", response_model=schemas.Token)
+async def login(request: Request, user_credentials: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    await rate_limiter.check_login_async(client_ip(request), user_credentials.username)
+    result = await db.execute(select(User).where(User.username == user_credentials.username))
+    user = result.scalars().first()
+
+    if not user or not user.hashed_password or not await hasher.verify_async(
+        user_credentials.password, user.hashed_password
+    ):
+        metrics.registry.inc(metrics.LOGINS, (("method", "password"), ("result", "failure")))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    last_login_buffer.record(user.id)
+    metrics.registry.inc(metrics.LOGINS, (("method", "password"), ("result", "success")))
+
+    access_token = auth.create_user_token(user)
+    user_agent, ip_address = request.headers.get("user-agent"), client_ip(request)
+    refresh_token = await db.run_sync(
+        lambda session: sessions.create_session(session, user.id, user_agent=user_agent, ip_address=ip_address)
+    )
+    await db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.get("/me", response_model=schemas.UserResponseExtended)
+async def read_users_me(current_user: User = Depends(get_current_user)):
+    return current_user
+
+@router.get("/admin/users", response_model=List[schemas.AdminUserResponse])
+async def get_all_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|created_at)$"),
+    is_active: Optional[bool] = None,
+    auth_provider: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Username or email prefix"),
+    current_admin: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = pagination.filter_users(select(User), is_active, auth_provider, q)
+    try:
+        query = pagination.seek(query, sort, cursor)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not cursor and skip:
+        query = query.offset(skip)
+    result = await db.execute(query.limit(limit))
+    users = result.scalars().all()
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(users[-1], sort)
+    return users
+
+@router.put("/admin/users/{user_id}/status", response_model=schemas.AdminUserResponse)
+async def update_user_status(
+    user_id: int,
+    status_update: schemas.UserStatusUpdate,
+    current_admin: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await _get_user_or_404(db, user_id)
+    was_active = user.is_active
+    await db.run_sync(lambda session: stats.status_changed(session, was_active, status_update.is_active))
+    user.is_active = status_update.is_active
+    await db.commit()
+    await db.refresh(user)
+    user_cache.invalidate(user.username)
+    auth.mark_claims_stale(user.id)
+    return user
+
+@router.delete("/admin/users/{user_id}")
+async def delete_user(
+    user_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await _get_user_or_404(db, user_id)
+
+    if user.id == current_admin.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot delete your own account"
+        )
+
+    username, was_active, provider = user.username, user.is_active, user.auth_provider
+    await db.run_sync(lambda session: stats.user_removed(session, was_active, provider))
+    await db.run_sync(lambda session: sessions.delete_user_sessions(session, [user_id]))
+    await db.delete(user)
+    await db.commit()
+    user_cache.invalidate(username)
+    auth.mark_claims_stale(user_id)
+    return {"message": "User deleted successfully"}
+
+@router.get("/admin/stats", response_model=schemas.UserStats)
+async def get_user_stats(
+    current_admin: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(stats.get_user_stats)
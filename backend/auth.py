@@ -1,30 +1,55 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError
 from datetime import datetime, timedelta
 from typing import Optional
-from dotenv import load_dotenv
-import os
+import threading
+import time
+import uuid
+from config import get_settings
+import metrics
+from jwt_keys import get_keyring
+from revocation import revocation_list
 
-load_dotenv()
+settings = get_settings()
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+# "database": resolve the caller's row on each request (through the principal cache)
+# "claims": authorize from the role/active claims in the token, with no query
+AUTH_MODE = settings.auth_mode
 
-# Try bcrypt first, fallback to pbkdf2_sha256 if bcrypt is not available
-try:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    # Test if bcrypt is working
-    pwd_context.hash("test")
-except Exception:
-    # Fallback to pbkdf2_sha256 which doesn't require additional packages
-    pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+ROLE_ADMIN = "admin"
+ROLE_USER = "user"
+# Service accounts (API gateways) that may only call /auth/introspect
+ROLE_INTROSPECTOR = "introspector"
+ROLES = (ROLE_USER, ROLE_ADMIN, ROLE_INTROSPECTOR)
+
+_pwd_context = None
+
+def get_pwd_context():
+    """Password hashing context, built on first use.
+
+    Try bcrypt first, fallback to pbkdf2_sha256 if bcrypt is not available.
+    Availability is decided by passlib's backend check, which runs its
+    self-test at the minimum cost instead of hashing at the default rounds.
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        try:
+            bcrypt_available = context.handler("bcrypt").has_backend()
+        except Exception:
+            bcrypt_available = False
+        if not bcrypt_available:
+            # Fallback to pbkdf2_sha256 which doesn't require additional packages
+            context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+        _pwd_context = context
+    return _pwd_context
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -32,16 +57,82 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti identifies the token for revocation on logout
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
+    encoded_jwt = get_keyring().sign(to_encode)
     return encoded_jwt
 
-def verify_token(token: str):
+def create_user_token(user, expires_delta: Optional[timedelta] = None) -> str:
+    """Access token carrying the claims needed to authorize without a lookup"""
+    return create_access_token(
+        data={"sub": user.username, "uid": user.id, "role": user.role, "active": bool(user.is_active)},
+        expires_delta=expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verified claims of a token, or None if it is invalid, expired or has no subject"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
+        payload = get_keyring().decode(token)
+    except ExpiredSignatureError:
+        metrics.registry.inc(metrics.TOKEN_FAILURES, (("reason", "expired"),))
+        return None
     except JWTError:
+        metrics.registry.inc(metrics.TOKEN_FAILURES, (("reason", "invalid"),))
+        return None
+    if payload.get("sub") is None:
+        metrics.registry.inc(metrics.TOKEN_FAILURES, (("reason", "missing_subject"),))
+        return None
+    if revocation_list.is_revoked(payload.get("jti")):
+        metrics.registry.inc(metrics.TOKEN_FAILURES, (("reason", "revoked"),))
+        return None
+    return payload
+
+def verify_token(token: str):
+    payload = decode_token(token)
+    return payload["sub"] if payload is not None else None
+
+
+class Principal:
+    """The caller as described by verified token claims"""
+
+    __slots__ = ("id", "username", "role", "is_active")
+
+    def __init__(self, id: int, username: str, role: str, is_active: bool):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user.id, user.username, user.role, bool(user.is_active))
+
+
+# Users whose status changed in this process, mapped to the time of the change.
+# Claims issued before then are stale and the caller is re-checked against the
+# database. Other workers only learn of the change when the token expires, so
+# ACCESS_TOKEN_EXPIRE_MINUTES bounds how stale claims can be across workers.
+_claims_changed_at = {}
+_claims_lock = threading.Lock()
+
+def mark_claims_stale(user_id: int):
+    now = time.time()
+    horizon = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    with _claims_lock:
+        _claims_changed_at[user_id] = now
+        if len(_claims_changed_at) > 1000:
+            # Tokens issued before the horizon have expired anyway
+            for stale_id in [uid for uid, at in _claims_changed_at.items() if at < horizon]:
+                del _claims_changed_at[stale_id]
+
+def principal_from_claims(payload: dict) -> Optional[Principal]:
+    """Principal built from the token alone, or None when the claims cannot be trusted"""
+    user_id = payload.get("uid")
+    role = payload.get("role")
+    if user_id is None or role is None or "active" not in payload:
+        # Issued before role claims existed
+        return None
+    changed_at = _claims_changed_at.get(user_id)
+    if changed_at is not None and payload.get("iat", 0) <= changed_at:
         return None
+    return Principal(user_id, payload["sub"], role, bool(payload["active"]))
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Load-testing and benchmark suite for the auth API
+
+Drives the FastAPI app in-process over ASGI (default) or a multi-worker
+uvicorn server against a throwaway SQLite database, and reports
+throughput and p50/p95/p99 latency per scenario as JSON. Google sign-in
+uses a stub keypair through GOOGLE_CERTS_FILE, so no network is needed.
+
+    python benchmark.py                                   # all scenarios, in-process
+    python benchmark.py --scenarios me,login --requests 2000 --concurrency 50
+    python benchmark.py --mode server --workers 4 --output after.json
+    python benchmark.py --compare before.json --threshold 0.15
+    python benchmark.py --scenarios me --cold-starts 10    # also time `import main` in fresh processes
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCENARIOS = ["signup", "login", "google_auth", "me", "admin_list", "admin_stats", "mixed"]
+
+# Scenario weights for the mixed workload
+MIXED_WEIGHTS = {"me": 60, "login": 10, "google_auth": 5, "admin_list": 10, "admin_stats": 10, "signup": 5}
+
+GOOGLE_CLIENT_ID = "benchmark-client.apps.googleusercontent.com"
+PASSWORD = "benchmark-password"
+
+
+def _configure_environment(workdir: str, seed_users: int) -> dict:
+    """Point the backend at a throwaway database and a stub Google keypair"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    certs_file = os.path.join(workdir, "google_certs.json")
+    with open(certs_file, "w") as f:
+        json.dump({"benchmark": public_pem}, f)
+
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        "GOOGLE_CERTS_FILE": certs_file,
+        "GOOGLE_CLIENT_ID": GOOGLE_CLIENT_ID,
+        # Every simulated client shares one address and one login
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    os.environ.update(env)
+    return {"env": env, "private_pem": private_pem, "seed_users": seed_users}
+
+
+def _seed_database(seed_users: int):
+    """Create the admin and seed users, hashing the shared password only once"""
+    import stats
+    from auth import get_password_hash
+    from bulk_import import import_users
+    from database import create_tables
+
+    create_tables()
+    stats.ensure_counters()
+    hashed = get_password_hash(PASSWORD)
+    rows = [{"username": "admin", "email": "admin@bench.local", "hashed_password": hashed}]
+    rows += [
+        {"username": f"user{i}", "email": f"user{i}@bench.local", "hashed_password": hashed}
+        for i in range(seed_users)
+    ]
+    import_users(rows)
+
+
+class GoogleTokenFactory:
+    def __init__(self, private_pem: str):
+        from google.auth import crypt
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id="benchmark")
+
+    def token(self, email: str, subject: str) -> str:
+        from google.auth import jwt as google_jwt
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": GOOGLE_CLIENT_ID,
+            "sub": subject,
+            "email": email,
+            "email_verified": True,
+            "iat": now,
+            "exp": now + 3600,
+        }
+        return google_jwt.encode(self._signer, payload).decode()
+
+
+class Context:
+    """State shared by scenario steps: tokens, counters and the Google stub"""
+
+    def __init__(self, seed_users: int, google: GoogleTokenFactory):
+        self.seed_users = seed_users
+        self.google = google
+        self.admin_token = None
+        self.user_tokens = []
+        self.signup_counter = 0
+        self.cursor = None
+        self.run_id = f"{os.getpid()}{int(time.time())}"
+
+    def random_user(self) -> str:
+        return f"user{random.randrange(self.seed_users)}"
+
+    def auth(self, token: str) -> dict:
+        return {"Authorization": f"Bearer {token}"}
+
+
+async def _login(client, username: str) -> str:
+    response = await client.post("/login", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+# --- Scenario steps ---------------------------------------------------------
+
+async def step_signup(client, ctx: Context):
+    ctx.signup_counter += 1
+    name = f"new{ctx.run_id}x{ctx.signup_counter}"
+    return await client.post("/signup", json={"username": name, "email": f"{name}@bench.local", "password": PASSWORD})
+
+
+async def step_login(client, ctx: Context):
+    return await client.post("/login", json={"username": ctx.random_user(), "password": PASSWORD})
+
+
+async def step_google_auth(client, ctx: Context):
+    # Mostly returning Google users, with some first-time sign-ups
+    n = random.randrange(ctx.seed_users * 2)
+    token = ctx.google.token(f"guser{n}@gmail.test", f"google-{n}")
+    return await client.post("/auth/google", json={"token": token})
+
+
+async def step_me(client, ctx: Context):
+    return await client.get("/me", headers=ctx.auth(random.choice(ctx.user_tokens)))
+
+
+async def step_admin_list(client, ctx: Context):
+    params = {"limit": 50}
+    if ctx.cursor:
+        params["cursor"] = ctx.cursor
+    response = await client.get("/admin/users", params=params, headers=ctx.auth(ctx.admin_token))
+    ctx.cursor = response.headers.get("x-next-cursor")
+    return response
+
+
+async def step_admin_stats(client, ctx: Context):
+    return await client.get("/admin/stats", headers=ctx.auth(ctx.admin_token))
+
+
+STEPS = {
+    "signup": step_signup,
+    "login": step_login,
+    "google_auth": step_google_auth,
+    "me": step_me,
+    "admin_list": step_admin_list,
+    "admin_stats": step_admin_stats,
+}
+
+
+async def step_mixed(client, ctx: Context):
+    names = list(MIXED_WEIGHTS)
+    name = random.choices(names, weights=[MIXED_WEIGHTS[n] for n in names])[0]
+    return await STEPS[name](client, ctx)
+
+
+STEPS["mixed"] = step_mixed
+
+
+# --- Runner -------------------------------------------------------------------
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, ctx: Context, name: str, requests: int, concurrency: int, warmup: int) -> dict:
+    step = STEPS[name]
+    for _ in range(warmup):
+        await step(client, ctx)
+
+    latencies = []
+    statuses = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await step(client, ctx)
+                code = str(response.status_code)
+            except Exception as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for code, count in statuses.items() if not code.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": statuses,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+async def _prepare_context(client, ctx: Context, token_pool: int):
+    ctx.admin_token = await _login(client, "admin")
+    for i in range(min(token_pool, ctx.seed_users)):
+        ctx.user_tokens.append(await _login(client, f"user{i}"))
+
+
+async def run_all(client, ctx: Context, args) -> dict:
+    await _prepare_context(client, ctx, args.token_pool)
+    results = {}
+    for name in args.scenarios:
+        print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...", file=sys.stderr)
+        results[name] = await run_scenario(client, ctx, name, args.requests, args.concurrency, args.warmup)
+    return results
+
+
+def run_in_process(ctx: Context, args) -> dict:
+    import httpx
+    import main
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return await run_all(client, ctx, args)
+
+    try:
+        return asyncio.run(go())
+    finally:
+        from login_tracker import last_login_buffer
+        last_login_buffer.stop()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_against_server(ctx: Context, args, env: dict) -> dict:
+    import httpx
+
+    port = args.port or _free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **env})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(base_url + "/").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.2)
+
+        async def go():
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+                return await run_all(client, ctx, args)
+
+        return asyncio.run(go())
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+_COLD_START_SCRIPT = (
+    "import time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def measure_cold_start(runs: int, env: dict) -> dict:
+    """Time `import main` in fresh interpreters, as a spawned worker would run it"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    # The schema already exists; workers started by start_server.py skip its setup too
+    child_env = {**os.environ, **env, "SKIP_SCHEMA_INIT": "true"}
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", _COLD_START_SCRIPT], cwd=backend_dir, env=child_env, stderr=subprocess.DEVNULL
+        )
+        timings.append(float(output.decode().strip().splitlines()[-1]) * 1000)
+    timings.sort()
+    return {
+        "requests": runs,
+        "errors": 0,
+        "status_codes": {},
+        "duration_s": round(sum(timings) / 1000, 3),
+        "throughput_rps": 0.0,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3) if timings else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return a message for every scenario that regressed beyond the threshold"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps"
+            )
+        for key in ("p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the auth API")
+    parser.add_argument("--mode", choices=["inprocess", "server"], default="inprocess")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per scenario")
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--token-pool", type=int, default=100, help="Distinct user tokens used by /me")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="uvicorn workers in server mode")
+    parser.add_argument("--port", type=int, help="Port for server mode (default: a free port)")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative regression")
+    parser.add_argument("--cold-starts", type=int, default=0,
+                        help="Also time importing the app in this many fresh processes")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="auth-benchmark-")
+    setup = _configure_environment(workdir, args.seed_users)
+    # Backend modules read their settings at import, so import them only now
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    _seed_database(args.seed_users)
+    ctx = Context(args.seed_users, GoogleTokenFactory(setup["private_pem"]))
+
+    if args.mode == "server":
+        scenarios = run_against_server(ctx, args, setup["env"])
+    else:
+        scenarios = run_in_process(ctx, args)
+    if args.cold_starts:
+        print(f"Measuring cold start ({args.cold_starts} processes)...", file=sys.stderr)
+        scenarios["cold_start"] = measure_cold_start(args.cold_starts, setup["env"])
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": _git_commit(),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "server" else 1,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "seed_users": args.seed_users,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": scenarios,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Regressions detected:", file=sys.stderr)
+            for message in regressions:
+                print(f"  {message}", file=sys.stderr)
+            sys.exit(1)
+        print("No regressions beyond threshold", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from typing import Iterator, List, Optional
+from sqlalchemy.orm import Session
+
+import auth
+import pagination
+import sessions
+from config import get_settings
+import stats
+from database import User
+from user_cache import user_cache
+
+settings = get_settings()
+
+# Rows touched per statement and transaction (stays under SQLite's bound parameter limit)
+BULK_CHUNK_SIZE = settings.bulk_chunk_size
+
+_COLUMNS = (User.id, User.username, User.is_active, User.auth_provider)
+
+
+def iter_target_chunks(db: Session, ids: Optional[List[int]] = None, filters: Optional[dict] = None,
+                       exclude_id: Optional[int] = None, chunk_size: int = BULK_CHUNK_SIZE) -> Iterator[list]:
+    """Yield the targeted users chunk by chunk as (id, username, is_active, auth_provider) rows.
+
+    Explicit ids are looked up by primary key; filters are walked with a
+    keyset scan on id so each chunk costs the same however far in we are.
+    """
+    if ids is not None:
+        unique_ids = sorted(set(ids))
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            query = db.query(*_COLUMNS).filter(User.id.in_(chunk))
+            if exclude_id is not None:
+                query = query.filter(User.id != exclude_id)
+            rows = query.all()
+            if rows:
+                yield rows
+        return
+
+    last_id = 0
+    while True:
+        query = pagination.filter_users(db.query(*_COLUMNS), **(filters or {}))
+        if exclude_id is not None:
+            query = query.filter(User.id != exclude_id)
+        rows = query.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+def bulk_update_status(db: Session, is_active: bool, exclude_id: int, ids: Optional[List[int]] = None,
+                       filters: Optional[dict] = None) -> dict:
+    """Set is_active on the targeted users with one UPDATE per chunk, never touching exclude_id"""
+    matched = affected = 0
+    for rows in iter_target_chunks(db, ids, filters, exclude_id=exclude_id):
+        matched += len(rows)
+        changed = [row for row in rows if bool(row.is_active) != is_active]
+        if changed:
+            db.query(User).filter(User.id.in_([row.id for row in changed])).update(
+                {User.is_active: is_active}, synchronize_session=False
+            )
+            stats.adjust(db, {"active": len(changed) if is_active else -len(changed)})
+        db.commit()
+        affected += len(changed)
+        for row in changed:
+            user_cache.invalidate(row.username)
+            auth.mark_claims_stale(row.id)
+    return {"matched": matched, "affected": affected}
+
+
+def bulk_delete(db: Session, exclude_id: int, ids: Optional[List[int]] = None,
+                filters: Optional[dict] = None) -> dict:
+    """Delete the targeted users with one DELETE per chunk, never touching exclude_id"""
+    matched = affected = 0
+    for rows in iter_target_chunks(db, ids, filters, exclude_id=exclude_id):
+        matched += len(rows)
+        deltas = {"total": -len(rows), "active": -sum(1 for row in rows if row.is_active)}
+        for row in rows:
+            key = f"provider:{row.auth_provider or 'local'}"
+            deltas[key] = deltas.get(key, 0) - 1
+        sessions.delete_user_sessions(db, [row.id for row in rows])
+        affected += db.query(User).filter(User.id.in_([row.id for row in rows])).delete(
+            synchronize_session=False
+        )
+        stats.adjust(db, deltas)
+        db.commit()
+        for row in rows:
+            user_cache.invalidate(row.username)
+            auth.mark_claims_stale(row.id)
+    return {"matched": matched, "affected": affected}
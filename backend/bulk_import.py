@@ -0,0 +1,249 @@
+import codecs
+import csv
+import json
+from typing import Callable, Iterable, Iterator, Optional
+from sqlalchemy.exc import IntegrityError
+
+import auth
+from config import get_settings
+import stats
+from database import SessionLocal, User, promote_default_admins
+from hashing import PasswordHasher
+
+settings = get_settings()
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Columns accepted from import files besides password / hashed_password
+IMPORT_FIELDS = ("username", "email", "is_active", "auth_provider", "google_id", "profile_picture")
+UNIQUE_FIELDS = ("username", "email", "google_id")
+
+_users = User.__table__
+
+
+def iter_rows(stream, fmt: str) -> Iterator:
+    """Yield rows from a binary CSV or NDJSON stream without loading it whole.
+
+    CSV rows come back as dicts; NDJSON lines are yielded unparsed so that a
+    malformed line is reported as a row error instead of aborting the import.
+    """
+    # Not io.TextIOWrapper: before Python 3.11 it cannot wrap the
+    # SpooledTemporaryFile behind an UploadFile (no readable())
+    text = codecs.iterdecode(stream, "utf-8")
+    if fmt == "csv":
+        for row in csv.DictReader(text):
+            yield row
+    elif fmt == "ndjson":
+        for line in text:
+            line = line.strip()
+            if line:
+                yield line
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _parse_bool(value) -> bool:
+    if value is None or value == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _normalize(raw) -> dict:
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    row = {field: raw.get(field) or None for field in IMPORT_FIELDS}
+    if not row["username"] or not row["email"]:
+        raise ValueError("username and email are required")
+    row["is_active"] = _parse_bool(raw.get("is_active"))
+    row["auth_provider"] = row["auth_provider"] or ("google" if row["google_id"] else "local")
+    hashed = raw.get("hashed_password") or None
+    password = raw.get("password") or None
+    if hashed:
+        # Pre-hashed passlib strings are stored as-is if we can verify them later
+        if not auth.get_pwd_context().identify(hashed, required=False):
+            raise ValueError("hashed_password is not in a supported passlib format")
+        row["hashed_password"] = hashed
+    elif password:
+        row["password"] = password
+    elif row["auth_provider"] == "local":
+        raise ValueError("password or hashed_password is required for local users")
+    return row
+
+
+class ImportReport:
+    """Running totals for an import plus per-row conflicts and errors"""
+
+    def __init__(self, max_issues: Optional[int] = 1000, on_issue: Optional[Callable] = None):
+        self.processed = 0
+        self.inserted = 0
+        self.conflict_count = 0
+        self.error_count = 0
+        self.issues = []
+        self.max_issues = max_issues
+        self.on_issue = on_issue
+
+    def _add(self, issue: dict):
+        if self.on_issue is not None:
+            self.on_issue(issue)
+        if self.max_issues is None or len(self.issues) < self.max_issues:
+            self.issues.append(issue)
+
+    def conflict(self, row_number: int, field: str, value):
+        self.conflict_count += 1
+        self._add({"row": row_number, "type": "conflict", "field": field, "value": value})
+
+    def error(self, row_number: int, message: str):
+        self.error_count += 1
+        self._add({"row": row_number, "type": "error", "message": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "conflicts": self.conflict_count,
+            "errors": self.error_count,
+            "issues": self.issues,
+        }
+
+
+def _existing_values(db, batch):
+    """Look up every unique value of the batch with one IN query per index"""
+    existing = {}
+    for field in UNIQUE_FIELDS:
+        values = {row[field] for _, row in batch if row[field]}
+        if not values:
+            existing[field] = set()
+            continue
+        column = getattr(User, field)
+        existing[field] = {value for (value,) in db.query(column).filter(column.in_(values))}
+    return existing
+
+
+def _drop_conflicts(db, batch, report: ImportReport):
+    existing = _existing_values(db, batch)
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    accepted = []
+    for row_number, row in batch:
+        conflict = None
+        for field in UNIQUE_FIELDS:
+            value = row[field]
+            if value and (value in existing[field] or value in seen[field]):
+                conflict = (field, value)
+                break
+        if conflict:
+            report.conflict(row_number, *conflict)
+            continue
+        for field in UNIQUE_FIELDS:
+            if row[field]:
+                seen[field].add(row[field])
+        accepted.append((row_number, row))
+    return accepted
+
+
+def _drop_plain_passwords(batch, report: ImportReport):
+    """Report rows that need hashing when the hasher has no workers to spare"""
+    accepted = []
+    for row_number, row in batch:
+        if "password" in row:
+            report.error(row_number, "password hashing is unavailable for API imports on this server "
+                                     "(HASH_WORKERS=1); send hashed_password or use import_users.py")
+        else:
+            accepted.append((row_number, row))
+    return accepted
+
+
+def _hash_passwords(batch, executor):
+    to_hash = [row for _, row in batch if "password" in row]
+    passwords = [row.pop("password") for row in to_hash]
+    if not passwords:
+        return
+    if executor is None:
+        hashes = map(auth.get_password_hash, passwords)
+    elif isinstance(executor, PasswordHasher):
+        hashes = executor.hash_batch(passwords)
+    else:
+        hashes = executor.map(auth.get_password_hash, passwords, chunksize=16)
+    for row, hashed in zip(to_hash, hashes):
+        row["hashed_password"] = hashed
+
+
+def _counter_deltas(rows) -> dict:
+    deltas = {"total": len(rows), "active": sum(1 for row in rows if row["is_active"])}
+    for row in rows:
+        key = f"provider:{row['auth_provider']}"
+        deltas[key] = deltas.get(key, 0) + 1
+    return deltas
+
+
+def _insert_batch(db, batch, report: ImportReport):
+    rows = [row for _, row in batch]
+    for row in rows:
+        row.setdefault("hashed_password", None)
+    try:
+        db.execute(_users.insert(), rows)
+        stats.adjust(db, _counter_deltas(rows))
+        db.commit()
+        report.inserted += len(rows)
+        return
+    except IntegrityError:
+        # Someone registered a clashing user since the pre-check; find the rows one by one
+        db.rollback()
+    for row_number, row in batch:
+        try:
+            db.execute(_users.insert(), [row])
+            stats.adjust(db, _counter_deltas([row]))
+            db.commit()
+            report.inserted += 1
+        except IntegrityError as e:
+            db.rollback()
+            report.conflict(row_number, "unique", str(e.orig))
+
+
+def import_users(rows: Iterable, batch_size: int = DEFAULT_BATCH_SIZE, executor=None,
+                 report: Optional[ImportReport] = None, session_factory=SessionLocal) -> ImportReport:
+    """Insert users from an iterable of raw rows in batched transactions.
+
+    Passwords are hashed with the given executor (threads or processes) when
+    one is passed; rows clashing with existing users or earlier rows of the
+    same batch are reported as conflicts and skipped.
+    """
+    report = report or ImportReport()
+    db = session_factory()
+    try:
+        # Seeding an empty database: its first row gets the admin role
+        seeding = db.query(User.id).first() is None
+        db.rollback()
+        batch = []
+        for row_number, raw in enumerate(rows, start=1):
+            report.processed += 1
+            try:
+                batch.append((row_number, _normalize(raw)))
+            except (ValueError, TypeError, AttributeError) as e:
+                report.error(row_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                _import_batch(db, batch, executor, report)
+                batch = []
+        if batch:
+            _import_batch(db, batch, executor, report)
+        # Core inserts skip the ORM hook that makes the first account an admin
+        if seeding and report.inserted:
+            promote_default_admins(db)
+            db.commit()
+    finally:
+        db.close()
+    return report
+
+
+def _import_batch(db, batch, executor, report: ImportReport):
+    accepted = _drop_conflicts(db, batch, report)
+    # End the read transaction before the slow hashing step
+    db.rollback()
+    if isinstance(executor, PasswordHasher) and not executor.import_workers:
+        accepted = _drop_plain_passwords(accepted, report)
+    if not accepted:
+        return
+    _hash_passwords(accepted, executor)
+    _insert_batch(db, accepted, report)
@@ -0,0 +1,103 @@
+"""
+Application settings, read once per process.
+
+Values come from the environment, with backend/.env loaded first for local
+development (variables already set in the environment take precedence).
+Field names map to upper-case variables: `db_pool_size` is DB_POOL_SIZE.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from dotenv import load_dotenv
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    # Database
+    database_url: str = "sqlite:///./test.db"
+    # Async driver URL; derived from database_url when not set
+    async_database_url: Optional[str] = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    slow_query_ms: float = 100
+    # Identical statements per request before the request is reported as N+1
+    n_plus_one_threshold: int = 5
+    # Add X-DB-Query-Count / X-DB-Query-Time-Ms to every response
+    sql_debug_headers: bool = False
+
+    # Tokens
+    secret_key: Optional[str] = None
+    algorithm: Optional[str] = None
+    access_token_expire_minutes: int = 30
+    # "database" or "claims"; see auth.AUTH_MODE
+    auth_mode: str = "database"
+    refresh_token_expire_days: int = 30
+    # RS256/ES256 signing keys (<kid>.pem files); see jwt_keys.py
+    jwt_keys_dir: Optional[str] = None
+    jwt_signing_kid: Optional[str] = None
+    jwks_max_age_seconds: int = 3600
+    # Accept HS256 tokens issued before this time after switching to RS256/ES256
+    legacy_hs256_until: Optional[datetime] = None
+    # Logged-out access tokens; see revocation.py
+    revocation_sync_seconds: float = 1
+    revocation_bloom_bits: int = 1 << 20
+    revocation_bloom_hashes: int = 7
+
+    # Password hashing; hash_workers defaults to the number of cores and
+    # import_hash_workers (the hasher share of API imports) to half of it,
+    # never more than hash_workers - 1
+    hash_workers: Optional[int] = None
+    hash_queue_size: Optional[int] = None
+    hash_retry_after: int = 1
+    import_hash_workers: Optional[int] = None
+
+    # Caches and write-behind buffers
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 60
+    stats_cache_seconds: float = 30
+    last_login_flush_seconds: float = 5
+    last_login_flush_size: int = 500
+    last_login_max_pending: int = 100000
+    last_login_late_seconds: float = 30
+    bulk_chunk_size: int = 500
+
+    # Rate limiting
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_sqlite_path: str = "./rate_limits.db"
+    rate_limit_window_seconds: float = 60
+    rate_limit_max_keys: int = 100000
+    login_ip_limit: int = 30
+    login_username_limit: int = 10
+    signup_ip_limit: int = 10
+    rate_limit_trust_proxy: bool = False
+
+    # Google sign-in
+    google_client_id: str = "your-google-client-id.apps.googleusercontent.com"
+    google_certs_url: str = "https://www.googleapis.com/oauth2/v1/certs"
+    google_certs_file: Optional[str] = None
+    google_certs_default_max_age: int = 3600
+    google_certs_refresh_margin: int = 300
+    google_clock_skew_seconds: int = 10
+
+    # Serving
+    async_api: bool = False
+    host: str = "0.0.0.0"
+    port: int = 8000
+    web_concurrency: Optional[int] = None
+    # Set by start_server.py for the workers it spawns
+    skip_schema_init: bool = False
+    server_launched_at: Optional[float] = None
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings()
@@ -1,17 +1,306 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import create_engine, event, select, Column, Integer, String, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from config import get_settings
+from contextvars import ContextVar
 from datetime import datetime
-import os
+import threading
+import time
+import metrics
 
-load_dotenv()
+settings = get_settings()
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DATABASE_URL = settings.database_url
+# Async driver URL; derived from DATABASE_URL when not set explicitly
+ASYNC_DATABASE_URL = settings.async_database_url
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Connection pool settings (all backends)
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_POOL_PRE_PING = settings.db_pool_pre_ping
+
+# SQLite tuning
+SQLITE_JOURNAL_MODE = settings.sqlite_journal_mode
+SQLITE_SYNCHRONOUS = settings.sqlite_synchronous
+SQLITE_BUSY_TIMEOUT_MS = settings.sqlite_busy_timeout_ms
+SQLITE_MMAP_SIZE = settings.sqlite_mmap_size
+
+# Query instrumentation
+SLOW_QUERY_MS = settings.slow_query_ms
+# Identical statements per request before the request is reported as N+1
+N_PLUS_ONE_THRESHOLD = settings.n_plus_one_threshold
+# Add X-DB-Query-Count / X-DB-Query-Time-Ms to every response
+SQL_DEBUG_HEADERS = settings.sql_debug_headers
+
+
+class PoolStats:
+    """Checkout counters and wait times for the engine's connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckoutMixin:
+    """Records how long each pool checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        waited = time.perf_counter() - start
+        pool_stats.record_wait(waited)
+        metrics.registry.observe(metrics.DB_POOL_WAIT, waited)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer holds the lock
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_sqlite_engine(url):
+    if url.database in (None, "", ":memory:"):
+        # A single shared connection, otherwise each checkout sees an empty database
+        return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def _create_server_engine(url):
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+def create_engine_for_url(database_url: str):
+    """Create an engine tuned for the backend named in the URL"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return _create_sqlite_engine(url)
+    return _create_server_engine(url)
+
+
+def get_pool_stats() -> dict:
+    pool = engine.pool
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    with pool_stats._lock:
+        checkouts = pool_stats.checkouts
+        return {
+            "backend": engine.dialect.name,
+            "pool_size": pool.size() if hasattr(pool, "size") else 1,
+            "checked_out": checked_out,
+            "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+            "checkouts": checkouts,
+            "timeouts": pool_stats.timeouts,
+            "avg_wait_ms": (pool_stats.total_wait / checkouts * 1000) if checkouts else 0.0,
+            "max_wait_ms": pool_stats.max_wait * 1000,
+        }
+
+
+class RequestQueries:
+    """Statements executed on behalf of one HTTP request"""
+
+    __slots__ = ("route", "count", "total_time", "statements", "repeated")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = {}
+        self.repeated = set()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        seen = self.statements.get(statement, 0) + 1
+        self.statements[statement] = seen
+        if seen == N_PLUS_ONE_THRESHOLD and statement not in self.repeated:
+            self.repeated.add(statement)
+            metrics.registry.inc(metrics.DB_REPEATED_QUERIES)
+            print(f"Possible N+1 in {self.route}: statement ran {seen}+ times: {_short_sql(statement)}")
+
+
+# Set by QueryStatsMiddleware; the threadpool and greenlet-based async
+# sessions both run with a copy of the request's context, so the hooks see it
+current_queries: ContextVar = ContextVar("current_queries", default=None)
+
+
+def _short_sql(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    tracker = current_queries.get()
+    if tracker is not None:
+        tracker.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = tracker.route if tracker is not None else "-"
+        metrics.registry.inc(metrics.DB_SLOW_QUERIES)
+        print(f"Slow query ({elapsed * 1000:.1f} ms, {route}): {_short_sql(statement)}")
+
+
+def instrument_engine(target):
+    """Attribute statement counts and time to the current request"""
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware collecting per-request query counts.
+
+    With SQL_DEBUG_HEADERS set, the totals are sent as response headers.
+    Queries issued after the response starts (streamed bodies, dependency
+    teardown) are still logged but are not in the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = RequestQueries(f"{scope['method']} {scope['path']}")
+        token = current_queries.set(tracker)
+
+        async def send_with_headers(message):
+            if SQL_DEBUG_HEADERS and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(tracker.count).encode()))
+                headers.append((b"x-db-query-time-ms", f"{tracker.total_time * 1000:.2f}".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_queries.reset(token)
+
+
+engine = create_engine_for_url(DATABASE_URL)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers used when ASYNC_DATABASE_URL is not given
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+async_engine = None
+AsyncSessionLocal = None
+
+
+def get_async_database_url() -> str:
+    if ASYNC_DATABASE_URL:
+        return ASYNC_DATABASE_URL
+    url = make_url(DATABASE_URL)
+    return str(url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)))
+
+
+def init_async_engine():
+    """Create the async engine and session factory on first use.
+
+    Requires the async driver for the backend (aiosqlite locally); raises
+    ImportError when it is not installed.
+    """
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        return async_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    url = make_url(get_async_database_url())
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        new_engine = create_async_engine(url, poolclass=StaticPool)
+    elif url.get_backend_name() == "sqlite":
+        new_engine = create_async_engine(
+            url,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            poolclass=TimedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    else:
+        new_engine = create_async_engine(
+            url,
+            poolclass=TimedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    instrument_engine(new_engine.sync_engine)
+    AsyncSessionLocal = sessionmaker(
+        bind=new_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    async_engine = new_engine
+    return async_engine
+
 Base = declarative_base()
 
 class User(Base):
@@ -27,6 +316,69 @@ class User(Base):
     google_id = Column(String, unique=True, nullable=True)  # Google user ID
     profile_picture = Column(String, nullable=True)  # Google profile picture URL
     auth_provider = Column(String, default="local")  # "local" or "google"
+    role = Column(String, nullable=False, default="user", server_default="user")  # "user", "admin" or "introspector"
+
+    # Composite indexes backing keyset pagination and the admin list filters
+    __table_args__ = (
+        Index("ix_users_is_active_id", "is_active", "id"),
+        Index("ix_users_auth_provider_id", "auth_provider", "id"),
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_last_login", "last_login"),
+    )
+
+@event.listens_for(User, "after_insert")
+def _first_user_is_admin(mapper, connection, target):
+    # The first account created in an empty database administers it
+    if target.id == 1 and target.role != "admin":
+        connection.execute(User.__table__.update().where(User.__table__.c.id == 1).values(role="admin"))
+        set_committed_value(target, "role", "admin")
+
+def promote_default_admins(conn) -> int:
+    """Make user 1 an administrator when no account is one.
+
+    For rows the hook never sees: Core bulk inserts into an empty table and
+    tables rebuilt by migrations. Takes a Connection or Session; returns the
+    users promoted.
+    """
+    users = User.__table__
+    if conn.execute(select(users.c.id).where(users.c.role == "admin").limit(1)).first() is not None:
+        return 0
+    return conn.execute(users.update().where(users.c.id == 1).values(role="admin")).rowcount
+
+
+class UserCounter(Base):
+    """Running user totals maintained alongside writes to the users table"""
+    __tablename__ = "user_counters"
+
+    name = Column(String, primary_key=True)  # "total", "active" or "provider:<name>"
+    value = Column(Integer, nullable=False, default=0)
+
+class UserSession(Base):
+    """A refresh token; rotations of one login share a family_id"""
+    __tablename__ = "user_sessions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String, nullable=False, index=True)
+    token_hash = Column(String, nullable=False, unique=True)  # SHA-256 of the refresh token
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    revoke_reason = Column(String, nullable=True)  # "rotated", "reuse", "logout" or "revoked"
+    user_agent = Column(String, nullable=True)
+    ip_address = Column(String, nullable=True)
+
+class RevokedToken(Base):
+    """A logged-out access token, kept until the token expires"""
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)  # workers sync rows above the last id they have seen
+    jti = Column(String, nullable=False, unique=True)
+    expires_at = Column(Integer, nullable=False, index=True)  # the token's exp, in Unix seconds
+
+    # Without AUTOINCREMENT SQLite reuses the ids of purged rows, which
+    # would fall below the other workers' sync watermark
+    __table_args__ = {"sqlite_autoincrement": True}
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
@@ -37,3 +389,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,23 +1,168 @@
-from google.auth.transport import requests
-from google.oauth2 import id_token
 from typing import Optional
-import os
-from dotenv import load_dotenv
+import json
+import re
+import threading
+import time
+from config import get_settings
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.orm import Session
+import metrics
+from database import User
 
-load_dotenv()
+settings = get_settings()
 
 # Google OAuth settings
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "your-google-client-id.apps.googleusercontent.com")
+GOOGLE_CLIENT_ID = settings.google_client_id
+GOOGLE_CERTS_URL = settings.google_certs_url
+# Optional JSON file of {"key id": "PEM certificate or public key"} used instead
+# of fetching Google's certs, e.g. a stub keypair for offline testing
+GOOGLE_CERTS_FILE = settings.google_certs_file
+GOOGLE_CERTS_DEFAULT_MAX_AGE = settings.google_certs_default_max_age
+# Refresh this many seconds before the cached certs expire
+GOOGLE_CERTS_REFRESH_MARGIN = settings.google_certs_refresh_margin
+GOOGLE_CLOCK_SKEW_SECONDS = settings.google_clock_skew_seconds
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleCertCache:
+    """Process-wide cache of Google's ID token signing certificates.
+
+    Certs are kept for the Cache-Control max-age Google sends and refreshed
+    in a background thread shortly before they expire, so verification only
+    blocks on the network for the very first token or after a long outage.
+    """
+
+    # Minimum seconds between forced refreshes triggered by unknown key ids
+    FORCED_REFRESH_INTERVAL = 60
+    # Seconds to wait before retrying after a failed refresh
+    RETRY_INTERVAL = 30
+
+    def __init__(self, certs_url: str = GOOGLE_CERTS_URL, certs_file: Optional[str] = GOOGLE_CERTS_FILE):
+        self.certs_url = certs_url
+        self.certs_file = certs_file
+        self._request = None
+        self._certs = None
+        self._expires_at = 0.0
+        self._next_attempt = 0.0
+        self._last_forced = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get_certs(self) -> dict:
+        now = time.monotonic()
+        certs = self._certs
+        if certs is not None and now < self._expires_at - GOOGLE_CERTS_REFRESH_MARGIN:
+            return certs
+        if certs is None or now >= self._expires_at:
+            # Nothing usable yet (or fully expired): fetch inline
+            with self._lock:
+                if self._certs is None or time.monotonic() >= self._expires_at:
+                    self._refresh_locked()
+                return self._certs
+        # Close to expiry: keep serving the cached certs and refresh behind the scenes
+        self._refresh_in_background()
+        return certs
+
+    def force_refresh(self) -> bool:
+        """Refresh now, e.g. after seeing an unknown key id; rate limited"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_forced < self.FORCED_REFRESH_INTERVAL:
+                return False
+            self._last_forced = now
+            self._next_attempt = 0.0
+            self._refresh_locked()
+            return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._next_attempt:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="google-certs", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh_locked()
+        except Exception as e:
+            print(f"Background Google cert refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _refresh_locked(self):
+        now = time.monotonic()
+        if now < self._next_attempt and self._certs is not None:
+            return
+        try:
+            certs, max_age = self._load()
+        except Exception:
+            self._next_attempt = now + self.RETRY_INTERVAL
+            if self._certs is None:
+                raise
+            # Keep serving the last known certs through network hiccups
+            self._expires_at = max(self._expires_at, now + self.RETRY_INTERVAL)
+            return
+        self._certs = certs
+        self._expires_at = now + max_age
+        self._next_attempt = 0.0
+
+    def _load(self):
+        if self.certs_file:
+            with open(self.certs_file) as f:
+                # Local certs never expire on their own
+                return json.load(f), float("inf")
+        if self._request is None:
+            from google.auth.transport import requests
+            # Reused so the underlying HTTP session keeps its connection pool
+            self._request = requests.Request()
+        response = self._request(self.certs_url, method="GET")
+        if response.status != 200:
+            raise ValueError(f"Could not fetch certificates at {self.certs_url}: HTTP {response.status}")
+        cache_control = response.headers.get("cache-control", "")
+        match = _MAX_AGE_RE.search(cache_control)
+        max_age = int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE
+        return json.loads(response.data.decode("utf-8")), max_age
+
+
+cert_cache = GoogleCertCache()
+
 
 class GoogleOAuth:
+    @staticmethod
+    def _decode(token: str) -> dict:
+        # Imported on first use so processes that never see SSO skip google-auth
+        from google.auth import jwt as google_jwt
+        try:
+            return google_jwt.decode(
+                token,
+                certs=cert_cache.get_certs(),
+                audience=GOOGLE_CLIENT_ID,
+                clock_skew_in_seconds=GOOGLE_CLOCK_SKEW_SECONDS,
+            )
+        except ValueError as e:
+            # Google may have rotated its keys before our cached copy expired
+            if "Certificate for key id" in str(e) and cert_cache.force_refresh():
+                return google_jwt.decode(
+                    token,
+                    certs=cert_cache.get_certs(),
+                    audience=GOOGLE_CLIENT_ID,
+                    clock_skew_in_seconds=GOOGLE_CLOCK_SKEW_SECONDS,
+                )
+            raise
+
     @staticmethod
     def verify_google_token(token: str) -> Optional[dict]:
         """Verify Google ID token and return user info"""
+        with metrics.registry.time(metrics.GOOGLE_VERIFY_DURATION):
+            return GoogleOAuth._verify(token)
+
+    @staticmethod
+    def _verify(token: str) -> Optional[dict]:
         try:
-            # Verify the token
-            idinfo = id_token.verify_oauth2_token(
-                token, requests.Request(), GOOGLE_CLIENT_ID
-            )
+            # Verify the token against the cached signing certs
+            idinfo = GoogleOAuth._decode(token)
             
             # Verify the issuer
             if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
@@ -33,11 +178,13 @@ class GoogleOAuth:
             }
             
             return user_info
-            
+        
         except ValueError as e:
+            metrics.registry.inc(metrics.GOOGLE_VERIFY_FAILURES, (("reason", "invalid"),))
             print(f"Token verification failed: {e}")
             return None
         except Exception as e:
+            metrics.registry.inc(metrics.GOOGLE_VERIFY_FAILURES, (("reason", "error"),))
             print(f"Error verifying Google token: {e}")
             return None
     
@@ -48,3 +195,26 @@ class GoogleOAuth:
         # Remove any non-alphanumeric characters
         username = ''.join(c for c in base_username if c.isalnum())
         return username[:30]  # Limit length
+
+    @staticmethod
+    def allocate_username(db: Session, email: str) -> str:
+        """Pick the generated username, or one past its highest numbered variant.
+
+        The base name is probed on the unique index; only if it is taken
+        does one aggregate over `base1`...`base9...` find the largest
+        suffix, so a single row comes back however many variants exist.
+        The result can still be taken by a concurrent sign-up before it
+        commits; the unique constraint catches that and the caller retries.
+        """
+        base = GoogleOAuth.generate_username_from_email(email) or "user"
+        if db.query(User.id).filter(User.username == base).first() is None:
+            return base
+        suffix = func.substr(User.username, len(base) + 1)
+        # Range scan over the index: base followed by a digit other than 0
+        query = db.query(func.max(cast(suffix, Integer))).filter(
+            User.username >= base + "1", User.username < base + ":"
+        )
+        if db.get_bind().dialect.name != "sqlite":
+            # SQLite casts "5x" to 5; other databases reject it
+            query = query.filter(suffix.regexp_match("^[0-9]+$"))
+        return f"{base}{(query.scalar() or 0) + 1}"
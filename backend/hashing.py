@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import auth
+import metrics
+from config import get_settings
+
+settings = get_settings()
+
+# Password hashing settings
+# bcrypt and hashlib's pbkdf2 both release the GIL, so a sized thread pool
+# gives real parallelism without the pickling overhead of a process pool.
+HASH_WORKERS = settings.hash_workers or os.cpu_count() or 2
+# Maximum number of hashes running or waiting; anything beyond is rejected
+# with 503. signup and login await their hash on the event loop, so waiting
+# requests hold no threadpool thread (that pool is the loop's default
+# executor, min(32, cores + 4) threads, shared by every sync route); the
+# bound only caps how long a login can queue: about 4 hash times by default.
+HASH_QUEUE_SIZE = settings.hash_queue_size or HASH_WORKERS * 4
+HASH_RETRY_AFTER = settings.hash_retry_after
+# Hashes that API imports, together, may have queued or running at once.
+# At least one worker always stays free for logins and signups, so with a
+# single hash worker (start_server.py's default when workers = cores) API
+# imports only accept pre-hashed passwords; import_users.py is not limited
+IMPORT_HASH_WORKERS = max(0, min(settings.import_hash_workers or HASH_WORKERS // 2, HASH_WORKERS - 1))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full"""
+    pass
+
+
+class PasswordHasher:
+    """Runs password hashing on a dedicated, bounded thread pool"""
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE,
+                 import_workers: int = IMPORT_HASH_WORKERS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.import_workers = import_workers
+        self._import_slots = threading.BoundedSemaphore(max(1, import_workers))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hasher")
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _run(self, operation, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.registry.observe(metrics.HASH_DURATION, elapsed, (("operation", operation),))
+            with self._lock:
+                self._completed += 1
+                self._total_seconds += elapsed
+                self._max_seconds = max(self._max_seconds, elapsed)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, operation: str, func, *args):
+        """Queue a hashing call and return its future, or raise HashingBusy"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(self._run, operation, func, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def hash(self, password: str) -> str:
+        return self.submit("hash", auth.get_password_hash, password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self.submit("verify", auth.verify_password, plain_password, hashed_password).result()
+
+    def _release_import_slot(self, _future):
+        self._import_slots.release()
+
+    def hash_batch(self, passwords) -> list:
+        """Hash passwords for bulk imports on the same workers as logins.
+
+        All imports together have at most IMPORT_HASH_WORKERS hashes queued
+        or running, so an interactive hash never waits behind more than that
+        many. They take no queue slots, so imports never cause a 503.
+        """
+        if not self.import_workers:
+            raise ValueError("No hash workers are set aside for imports")
+        futures = []
+        for password in passwords:
+            self._import_slots.acquire()
+            future = self._executor.submit(self._run, "import", auth.get_password_hash, password)
+            future.add_done_callback(self._release_import_slot)
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit("hash", auth.get_password_hash, password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self.submit("verify", auth.verify_password, plain_password, hashed_password))
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": self._pending,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_latency_ms": (self._total_seconds / completed * 1000) if completed else 0.0,
+                "max_latency_ms": self._max_seconds * 1000,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Bulk import users from a CSV or NDJSON file
+
+Rows need username and email plus either a plain `password` (hashed here,
+in parallel across cores) or a `hashed_password` passlib string. Optional
+columns: is_active, auth_provider, google_id, profile_picture.
+
+    python import_users.py users.csv
+    python import_users.py legacy.ndjson --workers 8 --report conflicts.ndjson
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import stats
+from bulk_import import DEFAULT_BATCH_SIZE, ImportReport, import_users, iter_rows
+from database import create_tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or NDJSON")
+    parser.add_argument("path", help="Import file (.csv or .ndjson/.jsonl)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used for password hashing")
+    parser.add_argument("--report", help="Write every conflict and error to this NDJSON file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+
+    create_tables()
+    stats.ensure_counters()
+
+    report_file = open(args.report, "w") if args.report else None
+    on_issue = (lambda issue: report_file.write(json.dumps(issue) + "\n")) if report_file else None
+    report = ImportReport(max_issues=20, on_issue=on_issue)
+
+    start = time.perf_counter()
+    try:
+        with open(args.path, "rb") as f, ProcessPoolExecutor(max_workers=args.workers) as executor:
+            import_users(iter_rows(f, fmt), batch_size=args.batch_size, executor=executor, report=report)
+    finally:
+        if report_file:
+            report_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Processed {report.processed} rows in {elapsed:.1f}s "
+          f"({report.processed / elapsed if elapsed else 0:.0f} rows/s)")
+    print(f"Inserted: {report.inserted}  Conflicts: {report.conflict_count}  Errors: {report.error_count}")
+    for issue in report.issues:
+        print(f"  row {issue['row']}: {issue.get('field', '')} {issue.get('value', issue.get('message', ''))}",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Keys that sign and verify access tokens.
+
+With ALGORITHM=HS256 tokens are signed with SECRET_KEY and nothing is
+published. With RS256 or ES256 every `<kid>.pem` private key in
+JWT_KEYS_DIR is loaded once per process: tokens are signed with
+JWT_SIGNING_KID (default: the last kid in sort order) and name it in their
+header, and the public keys are served at /.well-known/jwks.json so other
+services can verify tokens locally instead of calling /me. Local verifiers
+do not see logout revocations, so keep ACCESS_TOKEN_EXPIRE_MINUTES short.
+
+Rotating a key:
+1. `python jwt_keys.py --generate`, with JWT_SIGNING_KID still set to the
+   current kid, and restart: the new key is published but not used
+2. after JWKS_MAX_AGE_SECONDS, point JWT_SIGNING_KID at it and restart
+3. delete the old file once the tokens it signed have expired
+
+HS256 tokens issued before the switch to asymmetric keys are rejected
+unless LEGACY_HS256_UNTIL is set to the time of the switch. Then a token
+signed with SECRET_KEY is accepted only if it was issued before that time
+and expires within ACCESS_TOKEN_EXPIRE_MINUTES of it. Once that window has
+passed, unset LEGACY_HS256_UNTIL and SECRET_KEY.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from jose import JWTError, jwk, jwt
+from jose.exceptions import JWKError
+
+from config import get_settings
+
+settings = get_settings()
+
+JWT_KEYS_DIR = settings.jwt_keys_dir
+JWT_SIGNING_KID = settings.jwt_signing_kid
+# How long clients may cache the JWKS document
+JWKS_MAX_AGE_SECONDS = settings.jwks_max_age_seconds
+# When the signing algorithm was switched away from HS256; unset, HS256 tokens are refused
+LEGACY_HS256_UNTIL = settings.legacy_hs256_until
+
+# EdDSA is not listed: python-jose cannot sign or verify with OKP keys
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class KeyringError(Exception):
+    """Raised when the configured signing keys cannot be loaded"""
+    pass
+
+
+class Keyring:
+    """The signing key and every key accepted for verification"""
+
+    def __init__(self, algorithm: Optional[str], secret_key: Optional[str],
+                 keys_dir: Optional[str] = None, signing_kid: Optional[str] = None,
+                 legacy_until: Optional[datetime] = None, token_lifetime: float = 0):
+        self.algorithm = algorithm
+        self.secret_key = secret_key
+        self.legacy_until = None
+        if legacy_until is not None:
+            if legacy_until.tzinfo is None:
+                legacy_until = legacy_until.replace(tzinfo=timezone.utc)
+            self.legacy_until = legacy_until.timestamp()
+        self.token_lifetime = token_lifetime
+        self.signing_kid = None
+        self._signing_key = None
+        self._public_keys = {}
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            self._load(keys_dir, signing_kid)
+        jwks = {"keys": [self._jwk(kid, key) for kid, key in sorted(self._public_keys.items())]}
+        self.jwks_json = json.dumps(jwks, separators=(",", ":")).encode()
+        self.jwks_etag = '"' + hashlib.sha256(self.jwks_json).hexdigest()[:16] + '"'
+
+    def _load(self, keys_dir: Optional[str], signing_kid: Optional[str]):
+        if not keys_dir or not os.path.isdir(keys_dir):
+            raise KeyringError(f"{self.algorithm} needs JWT_KEYS_DIR pointing at a directory of <kid>.pem keys")
+        private_keys = {}
+        for name in sorted(os.listdir(keys_dir)):
+            if not name.endswith(".pem"):
+                continue
+            kid = name[:-len(".pem")]
+            with open(os.path.join(keys_dir, name)) as f:
+                pem = f.read()
+            try:
+                private_keys[kid] = jwk.construct(pem, self.algorithm)
+            except JWKError as e:
+                raise KeyringError(f"{name} is not a {self.algorithm} private key: {e}")
+        if not private_keys:
+            raise KeyringError(f"No .pem keys in {keys_dir}")
+        self.signing_kid = signing_kid or max(private_keys)
+        if self.signing_kid not in private_keys:
+            raise KeyringError(f"Signing key {self.signing_kid}.pem not found in {keys_dir}")
+        self._signing_key = private_keys[self.signing_kid]
+        self._public_keys = {kid: key.public_key() for kid, key in private_keys.items()}
+
+    def _jwk(self, kid: str, key) -> dict:
+        return {**key.to_dict(), "kid": kid, "use": "sig", "alg": self.algorithm}
+
+    def sign(self, claims: dict) -> str:
+        if self._signing_key is None:
+            return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+        return jwt.encode(claims, self._signing_key, algorithm=self.algorithm, headers={"kid": self.signing_kid})
+
+    def decode(self, token: str) -> dict:
+        """Verified claims of a token; raises JWTError (or ExpiredSignatureError)"""
+        if self._signing_key is None:
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._public_keys.get(kid)
+        if key is not None:
+            # The algorithm comes from our configuration, never from the token
+            return jwt.decode(token, key, algorithms=[self.algorithm])
+        if kid is None and self.secret_key and self.legacy_until is not None:
+            return self._decode_legacy(token)
+        raise JWTError("Unknown signing key")
+
+    def _decode_legacy(self, token: str) -> dict:
+        """Claims of an HS256 token issued before the switch to asymmetric keys"""
+        payload = jwt.decode(token, self.secret_key, algorithms=["HS256"])
+        issued_at = payload.get("iat")
+        # The secret may outlive the switch, so bound both ends of the token's life
+        if not isinstance(issued_at, (int, float)) or issued_at > self.legacy_until:
+            raise JWTError("HS256 token issued after the switch to asymmetric keys")
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at > self.legacy_until + self.token_lifetime:
+            raise JWTError("HS256 token outlives the legacy window")
+        return payload
+
+
+def generate_key(keys_dir: str, algorithm: str) -> str:
+    """Write a new private key to keys_dir and return its kid"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise KeyringError(f"Cannot generate keys for {algorithm}; use one of {', '.join(ASYMMETRIC_ALGORITHMS)}")
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    os.makedirs(keys_dir, exist_ok=True)
+    kid = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    return kid
+
+
+_keyring = None
+
+def get_keyring() -> Keyring:
+    """The process keyring, loaded on first use"""
+    global _keyring
+    if _keyring is None:
+        _keyring = Keyring(
+            settings.algorithm, settings.secret_key, JWT_KEYS_DIR, JWT_SIGNING_KID,
+            legacy_until=LEGACY_HS256_UNTIL, token_lifetime=settings.access_token_expire_minutes * 60,
+        )
+    return _keyring
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the access-token signing keys")
+    parser.add_argument("--generate", action="store_true", help="Add a new private key to JWT_KEYS_DIR")
+    parser.add_argument("--algorithm", default=settings.algorithm, choices=ASYMMETRIC_ALGORITHMS)
+    args = parser.parse_args()
+
+    try:
+        if args.generate:
+            if not JWT_KEYS_DIR:
+                print("❌ Set JWT_KEYS_DIR first")
+                sys.exit(1)
+            kid = generate_key(JWT_KEYS_DIR, args.algorithm)
+            print(f"✅ Created {os.path.join(JWT_KEYS_DIR, kid + '.pem')} (kid {kid})")
+        else:
+            keyring = get_keyring()
+            print(f"Algorithm: {keyring.algorithm}")
+            print(f"Signing kid: {keyring.signing_kid or '-'}")
+            print(keyring.jwks_json.decode())
+    except KeyringError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
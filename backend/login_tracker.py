@@ -0,0 +1,138 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import bindparam
+
+from config import get_settings
+from database import SessionLocal, User
+
+settings = get_settings()
+
+# Write-behind settings for last_login updates
+LAST_LOGIN_FLUSH_SECONDS = settings.last_login_flush_seconds
+LAST_LOGIN_FLUSH_SIZE = settings.last_login_flush_size
+# Updates are coalesced per user; beyond this many distinct users new ones are dropped
+LAST_LOGIN_MAX_PENDING = settings.last_login_max_pending
+# A write is counted as late when it lands this long after the login
+LAST_LOGIN_LATE_SECONDS = settings.last_login_late_seconds
+
+_users = User.__table__
+_update_last_login = (
+    _users.update()
+    .where(_users.c.id == bindparam("user_id"))
+    .values(last_login=bindparam("login_time"))
+)
+
+
+class LastLoginBuffer:
+    """Collects last_login updates in memory and writes them in batches.
+
+    Logins only touch a dict; a background thread flushes the latest value
+    per user with one executemany UPDATE every LAST_LOGIN_FLUSH_SECONDS or
+    as soon as LAST_LOGIN_FLUSH_SIZE users are pending.
+    """
+
+    def __init__(self, interval: float = LAST_LOGIN_FLUSH_SECONDS, flush_size: int = LAST_LOGIN_FLUSH_SIZE,
+                 max_pending: int = LAST_LOGIN_MAX_PENDING):
+        self.interval = interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.late = 0
+        self.failures = 0
+
+    def record(self, user_id: int, login_time: datetime = None):
+        login_time = login_time or datetime.utcnow()
+        with self._lock:
+            if user_id not in self._pending and len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending[user_id] = (login_time, time.monotonic())
+            full = len(self._pending) >= self.flush_size
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all pending updates now and return how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            rows = [{"user_id": user_id, "login_time": login_time} for user_id, (login_time, _) in batch.items()]
+            db = SessionLocal()
+            try:
+                db.execute(_update_last_login, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self._requeue(batch)
+                with self._lock:
+                    self.failures += 1
+                print(f"Flushing last_login updates failed: {e}")
+                return 0
+            finally:
+                db.close()
+            now = time.monotonic()
+            late = sum(1 for _, queued_at in batch.values() if now - queued_at > LAST_LOGIN_LATE_SECONDS)
+            with self._lock:
+                self.flushed += len(rows)
+                self.batches += 1
+                self.late += late
+            return len(rows)
+
+    def _requeue(self, batch: dict):
+        with self._lock:
+            for user_id, entry in batch.items():
+                # Keep newer logins recorded while the flush was running
+                if user_id in self._pending:
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self._pending[user_id] = entry
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Stop the background thread and write whatever is still pending"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "dropped": self.dropped,
+                "late": self.late,
+                "failures": self.failures,
+            }
+
+
+last_login_buffer = LastLoginBuffer()
@@ -1,13 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
-from typing import List
+from datetime import datetime
+from typing import List, Optional
+import os
+import time
 import schemas
 import auth
-from database import get_db, User, create_tables
+import bulk_admin
+import bulk_import
+import metrics
+import pagination
+import search
+import sessions
+import stats
+import user_export
+import database
+from config import get_settings
+from database import get_db, get_pool_stats, SessionLocal, User, create_tables
 from google_oauth import GoogleOAuth
+from hashing import hasher, HashingBusy, HASH_RETRY_AFTER
+from user_cache import user_cache
+from login_tracker import last_login_buffer
+from rate_limit import rate_limiter, client_ip, RateLimited
+from revocation import revocation_list
+from jwt_keys import get_keyring, JWKS_MAX_AGE_SECONDS
 
 app = FastAPI(title="Auth API", description="Authentication API with JWT")
 
@@ -18,14 +40,81 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Create tables
-create_tables()
+app.add_middleware(database.QueryStatsMiddleware)
+
+# Outermost middleware, so the recorded latency covers the whole stack
+app.add_middleware(metrics.MetricsMiddleware)
+
+settings = get_settings()
+
+# start_server.py initialises the schema once in the master process and
+# sets SKIP_SCHEMA_INIT for the workers it spawns
+if settings.skip_schema_init:
+    search.ensure_search_index(create=False)
+else:
+    create_tables()
+    stats.ensure_counters()
+    search.ensure_search_index()
+
+# Serve the auth and admin endpoints from async handlers (needs aiosqlite locally)
+ASYNC_API = settings.async_api
 
 security = HTTPBearer()
+# Logout succeeds without a token, as it did before tokens could be revoked
+optional_security = HTTPBearer(auto_error=False)
+
+@app.exception_handler(HashingBusy)
+def hashing_busy_handler(request: Request, exc: HashingBusy):
+    # Shed load early instead of queueing more work behind a saturated hasher
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(HASH_RETRY_AFTER)},
+    )
+
+@app.exception_handler(RateLimited)
+def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many attempts, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+def report_startup_time():
+    if settings.server_launched_at:
+        print(f"Worker {os.getpid()} ready {time.time() - settings.server_launched_at:.2f}s after launch")
+
+@app.on_event("startup")
+def load_signing_keys():
+    # Fail at startup, not on the first login, when the keys are misconfigured
+    get_keyring()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+@app.on_event("startup")
+def load_revoked_tokens():
+    revocation_list.start()
+
+@app.on_event("shutdown")
+def stop_revocation_sync():
+    revocation_list.stop()
+
+@app.on_event("shutdown")
+def shutdown_hasher():
+    hasher.shutdown()
+
+@app.on_event("shutdown")
+def flush_last_logins():
+    last_login_buffer.stop()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     username = auth.verify_token(token)
     if username is None:
@@ -34,33 +123,74 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.username == username).first()
+    # Repeat callers are served from the principal cache without touching the DB
+    user = user_cache.get(username, token)
+    if user is not None:
+        return user
+    # The row is loaded in its own short-lived session so the cached instance
+    # is detached and never expired by a commit in the handler's session
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+    finally:
+        db.close()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    user_cache.set(username, token, user)
     return user
 
+def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """The caller for authorization only; in claims mode this costs no query"""
+    if auth.AUTH_MODE == "claims":
+        payload = auth.decode_token(credentials.credentials)
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = auth.principal_from_claims(payload)
+        if principal is not None:
+            if not principal.is_active:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+            return principal
+    # Database mode, tokens without role claims and claims made stale by a
+    # status change are resolved from the user row
+    return get_current_user(credentials)
+
 # Admin check function
-def get_current_admin_user(current_user: User = Depends(get_current_user)):
-    # For demo purposes, make the first user or user with username 'admin' an admin
-    # In production, you should have a proper role-based system
-    if current_user.id == 1 or current_user.username.lower() == "admin":
+def get_current_admin_user(current_user: User = Depends(get_current_principal)):
+    if current_user.role == auth.ROLE_ADMIN:
         return current_user
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="Not enough permissions. Admin access required."
     )
 
-@app.post("/signup", response_model=schemas.UserResponseExtended)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    # Check if user already exists
-    db_user = db.query(User).filter(
-        (User.username == user.username) | (User.email == user.email)
-    ).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username or email already registered")
-    
-    # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+def get_current_introspector(current_user: User = Depends(get_current_principal)):
+    # A gateway account holds this role instead of admin rights
+    if current_user.role == auth.ROLE_INTROSPECTOR:
+        return current_user
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not enough permissions. Introspector role required."
+    )
+
+if ASYNC_API:
+    import async_routes
+    database.init_async_engine()
+    # Registered before the sync routes below, so these handlers take precedence
+    app.include_router(async_routes.router, include_in_schema=False)
+
+# signup and login are async so that a request waiting for the hasher holds
+# no threadpool thread; their database work still runs in the threadpool
+
+def _registered(db: Session, username: str, email: str) -> bool:
+    return db.query(User.id).filter((User.username == username) | (User.email == email)).first() is not None
+
+def _create_local_user(db: Session, user: schemas.UserCreate, hashed_password: str) -> User:
     db_user = User(
         username=user.username,
         email=user.email,
@@ -68,39 +198,133 @@ def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
         auth_provider="local"
     )
     db.add(db_user)
+    stats.user_added(db, auth_provider="local")
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def _find_user(db: Session, username: str) -> Optional[User]:
+    return db.query(User).filter(User.username == username).first()
+
+def _issue_tokens(db: Session, user: User, user_agent: Optional[str], ip_address: str) -> dict:
+    access_token = auth.create_user_token(user)
+    refresh_token = sessions.create_session(db, user.id, user_agent=user_agent, ip_address=ip_address)
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@app.post("/signup", response_model=schemas.UserResponseExtended)
+async def signup(request: Request, user: schemas.UserCreate, db: Session = Depends(get_db)):
+    await rate_limiter.check_signup_async(client_ip(request))
+    # Check if user already exists
+    if await run_in_threadpool(_registered, db, user.username, user.email):
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    
+    # Create new user
+    hashed_password = await hasher.hash_async(user.password)
+    return await run_in_threadpool(_create_local_user, db, user, hashed_password)
+
 @app.post("/login", response_model=schemas.Token)
-def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == user_credentials.username).first()
+async def login(request: Request, user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+    # Throttle before the lookup and the password hash
+    await rate_limiter.check_login_async(client_ip(request), user_credentials.username)
+    user = await run_in_threadpool(_find_user, db, user_credentials.username)
     
-    if not user or not auth.verify_password(user_credentials.password, user.hashed_password):
+    if not user or not user.hashed_password or not await hasher.verify_async(
+        user_credentials.password, user.hashed_password
+    ):
+        metrics.registry.inc(metrics.LOGINS, (("method", "password"), ("result", "failure")))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Update last login time
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # Update last login time (written behind in batches)
+    last_login_buffer.record(user.id)
+    metrics.registry.inc(metrics.LOGINS, (("method", "password"), ("result", "success")))
     
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+    return await run_in_threadpool(
+        _issue_tokens, db, user, request.headers.get("user-agent"), client_ip(request)
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+
+@app.post("/token/refresh", response_model=schemas.Token)
+def refresh_access_token(request: Request, refresh_request: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and refresh token"""
+    try:
+        user, refresh_token = sessions.rotate(
+            db, refresh_request.refresh_token,
+            user_agent=request.headers.get("user-agent"), ip_address=client_ip(request)
+        )
+    except sessions.RefreshError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token = auth.create_user_token(user)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 # Google SSO endpoints
+# Attempts at the Google sign-in transaction before giving up with 409
+GOOGLE_SIGN_IN_ATTEMPTS = 3
+
+def sign_in_google_user(db: Session, user_info: dict):
+    """Find, link or create the user for a verified Google identity.
+
+    Returns the signed-in principal and whether the stored profile changed;
+    the caller commits. Issues at most one lookup, one username scan, the
+    counter updates and one write.
+    """
+    # Match by email (existing users linking Google) or by Google ID in one query
+    matches = db.query(User).filter(
+        or_(User.email == user_info['email'], User.google_id == user_info['google_id'])
+    ).limit(2).all()
+    user = next((match for match in matches if match.email == user_info['email']), None)
+    if user is None and matches:
+        # Known Google ID whose email changed on Google's side
+        user = matches[0]
+        last_login_buffer.record(user.id)
+        return auth.Principal.from_user(user), False
+
+    if user:
+        # Existing user - update with Google info, writing only when it changed
+        principal = auth.Principal.from_user(user)
+        if (user.google_id, user.profile_picture, user.auth_provider) != (
+            user_info['google_id'], user_info['picture'], "google"
+        ):
+            stats.provider_changed(db, user.auth_provider, "google")
+            user.google_id = user_info['google_id']
+            user.profile_picture = user_info['picture']
+            user.auth_provider = "google"
+            user.last_login = datetime.utcnow()
+            return principal, True
+        last_login_buffer.record(user.id)
+        return principal, False
+
+    # Create new user from Google account
+    user = User(
+        username=GoogleOAuth.allocate_username(db, user_info['email']),
+        email=user_info['email'],
+        google_id=user_info['google_id'],
+        profile_picture=user_info['picture'],
+        auth_provider="google",
+        hashed_password=None,  # No password for Google users
+        last_login=datetime.utcnow()
+    )
+    db.add(user)
+    stats.user_added(db, auth_provider="google")
+    # Flush first so the id and role are known without a refresh after commit
+    db.flush()
+    return auth.Principal.from_user(user), False
+
 @app.post("/auth/google", response_model=schemas.Token)
-def google_auth(google_request: schemas.GoogleLoginRequest, db: Session = Depends(get_db)):
+def google_auth(request: Request, google_request: schemas.GoogleLoginRequest, db: Session = Depends(get_db)):
     """Authenticate user with Google OAuth"""
     
     # Verify Google token
     user_info = GoogleOAuth.verify_google_token(google_request.token)
     if not user_info:
+        metrics.registry.inc(metrics.LOGINS, (("method", "google"), ("result", "failure")))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Google token"
@@ -112,78 +336,222 @@ def google_auth(google_request: schemas.GoogleLoginRequest, db: Session = Depend
             detail="Google account email not verified"
         )
     
-    # First check if user exists by email (for existing users who want to link Google)
-    user = db.query(User).filter(User.email == user_info['email']).first()
-    
-    if user:
-        # Existing user - update with Google info
-        user.google_id = user_info['google_id']
-        user.profile_picture = user_info['picture']
-        user.auth_provider = "google"
-        user.last_login = datetime.utcnow()
-        db.commit()
-        db.refresh(user)
-    else:
-        # Check if Google ID already exists (shouldn't happen, but safety check)
-        existing_google_user = db.query(User).filter(User.google_id == user_info['google_id']).first()
-        if existing_google_user:
-            user = existing_google_user
-            user.last_login = datetime.utcnow()
-            db.commit()
-            db.refresh(user)
-        else:
-            # Create new user from Google account
-            username = GoogleOAuth.generate_username_from_email(user_info['email'])
-            
-            # Ensure username is unique
-            base_username = username
-            counter = 1
-            while db.query(User).filter(User.username == username).first():
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            user = User(
-                username=username,
-                email=user_info['email'],
-                google_id=user_info['google_id'],
-                profile_picture=user_info['picture'],
-                auth_provider="google",
-                hashed_password=None,  # No password for Google users
-                last_login=datetime.utcnow()
+    # A lost race (same account signing in twice, or another sign-up taking
+    # the allocated username) fails on a unique constraint; start over
+    for attempt in range(GOOGLE_SIGN_IN_ATTEMPTS):
+        try:
+            principal, profile_changed = sign_in_google_user(db, user_info)
+            refresh_token = sessions.create_session(
+                db, principal.id, user_agent=request.headers.get("user-agent"), ip_address=client_ip(request)
             )
-            db.add(user)
             db.commit()
-            db.refresh(user)
+            break
+        except IntegrityError:
+            db.rollback()
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not create the account, please try again"
+        )
     
+    if profile_changed:
+        user_cache.invalidate(principal.username)
+    metrics.registry.inc(metrics.LOGINS, (("method", "google"), ("result", "success")))
+
     # Generate JWT token
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = auth.create_user_token(principal)
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+# Tokens accepted by one introspection request
+INTROSPECT_MAX_TOKENS = 1000
+# Usernames per IN query, below SQLite's bound-parameter limit
+INTROSPECT_CHUNK_SIZE = 500
+
+@app.post("/auth/introspect", response_model=List[schemas.IntrospectResult], response_model_exclude_none=True)
+def introspect_tokens(
+    introspect_request: schemas.IntrospectRequest,
+    current_gateway: User = Depends(get_current_introspector)
+):
+    """Verify a batch of access tokens for a gateway; results follow the request order.
+
+    Signatures and revocations are checked in memory, and the users not in
+    the principal cache are loaded with one IN query instead of a /me call
+    per token. Callers need the introspector role (PUT /admin/users/{id}/role),
+    which grants nothing else, and renew their token with /token/refresh.
+    """
+    tokens = introspect_request.tokens
+    if len(tokens) > INTROSPECT_MAX_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {INTROSPECT_MAX_TOKENS} tokens per request"
+        )
+    payloads = {}
+    for token in tokens:
+        if token not in payloads:
+            payloads[token] = auth.decode_token(token)
+
+    users = {}
+    missing = set()
+    for token, payload in payloads.items():
+        if payload is None:
+            continue
+        user = user_cache.get(payload["sub"], token)
+        if user is not None:
+            users[token] = user
+        else:
+            missing.add(payload["sub"])
+    if missing:
+        names = list(missing)
+        # Detached rows, as in get_current_user, so they can be cached
+        db = SessionLocal()
+        try:
+            by_name = {}
+            for start in range(0, len(names), INTROSPECT_CHUNK_SIZE):
+                for user in db.query(User).filter(User.username.in_(names[start:start + INTROSPECT_CHUNK_SIZE])):
+                    by_name[user.username] = user
+        finally:
+            db.close()
+        for token, payload in payloads.items():
+            user = by_name.get(payload["sub"]) if payload is not None and token not in users else None
+            if user is not None:
+                users[token] = user
+                if user.is_active:
+                    user_cache.set(user.username, token, user)
+
+    results = []
+    for token in tokens:
+        user = users.get(token)
+        if user is None or not user.is_active:
+            results.append({"active": False})
+        else:
+            results.append({
+                "active": True, "sub": user.username, "uid": user.id, "role": user.role,
+                "exp": payloads[token]["exp"],
+            })
+    return results
 
 @app.get("/me", response_model=schemas.UserResponseExtended)
 def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.post("/logout")
-def logout():
-    # In a real application, you might want to blacklist the token
+def logout(
+    logout_request: Optional[schemas.LogoutRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
+    """Revoke the bearer token, and the refresh token's login when one is given"""
+    if credentials is not None:
+        payload = auth.decode_token(credentials.credentials)
+        if payload is not None and payload.get("jti"):
+            revocation_list.revoke(payload["jti"], payload["exp"])
+    if logout_request is not None and logout_request.refresh_token:
+        sessions.revoke_token(db, logout_request.refresh_token)
     return {"message": "Successfully logged out"}
 
+@app.get("/sessions", response_model=List[schemas.SessionResponse])
+def list_my_sessions(current_user: User = Depends(get_current_principal), db: Session = Depends(get_db)):
+    """Signed-in devices of the current user"""
+    return sessions.list_sessions(db, current_user.id)
+
+@app.delete("/sessions")
+def revoke_my_sessions(current_user: User = Depends(get_current_principal), db: Session = Depends(get_db)):
+    """Sign out everywhere (access tokens stay valid until they expire)"""
+    count = sessions.revoke_user_sessions(db, current_user.id)
+    return {"message": f"Revoked {count} session(s)"}
+
+@app.delete("/sessions/{session_id}")
+def revoke_my_session(
+    session_id: int,
+    current_user: User = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    if not sessions.revoke_session(db, current_user.id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked"}
+
 # Admin endpoints for user management
 @app.get("/admin/users", response_model=List[schemas.AdminUserResponse])
 def get_all_users(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|created_at)$"),
+    is_active: Optional[bool] = None,
+    auth_provider: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Username or email prefix"),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """Get all users (admin only)"""
-    users = db.query(User).offset(skip).limit(limit).all()
+    """Get all users (admin only)
+
+    Pass the X-Next-Cursor header of a page back as `cursor` to fetch the
+    next one with constant cost; `skip` is only honoured without a cursor.
+    """
+    query = pagination.filter_users(db.query(User), is_active, auth_provider, q)
+    try:
+        query = pagination.seek(query, sort, cursor)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not cursor and skip:
+        query = query.offset(skip)
+    users = query.limit(limit).all()
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(users[-1], sort)
     return users
 
+@app.post("/admin/users/import", response_model=schemas.ImportReport)
+def bulk_import_users(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    batch_size: int = Query(bulk_import.DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Bulk import users from an NDJSON or CSV upload (admin only)
+
+    Rows need username and email plus a password or a passlib
+    hashed_password. Conflicting rows are skipped and reported. With a
+    single hash worker, rows with a plain password are reported as errors.
+    """
+    # Passwords go through the shared hasher, capped so logins keep workers
+    report = bulk_import.import_users(
+        bulk_import.iter_rows(file.file, format), batch_size=batch_size, executor=hasher
+    )
+    return report.to_dict()
+
+@app.get("/admin/users/export")
+def export_users(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    is_active: Optional[bool] = None,
+    auth_provider: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Username or email prefix"),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Stream every matching user as NDJSON or CSV (admin only)"""
+    rows = user_export.iter_export(format, is_active, auth_provider, q)
+    return StreamingResponse(
+        rows,
+        media_type=user_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+@app.get("/admin/users/search", response_model=List[schemas.AdminUserResponse])
+def search_users(
+    q: str = Query(..., min_length=1),
+    auth_provider: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Search users by username, email or auth provider (admin only)
+
+    Results are ranked with exact username/email matches first.
+    """
+    return search.search_users(db, q, auth_provider, limit, offset)
+
 @app.get("/admin/users/{user_id}", response_model=schemas.AdminUserResponse)
 def get_user_by_id(
     user_id: int,
@@ -208,11 +576,57 @@ def update_user_status(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    stats.status_changed(db, user.is_active, status_update.is_active)
     user.is_active = status_update.is_active
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.username)
+    auth.mark_claims_stale(user.id)
+    return user
+
+@app.put("/admin/users/{user_id}/role", response_model=schemas.AdminUserResponse)
+def update_user_role(
+    user_id: int,
+    role_update: schemas.UserRoleUpdate,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Make a user an admin, a gateway introspector or a regular user (admin only)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user.id == current_admin.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot change your own role"
+        )
+
+    user.role = role_update.role
+    db.commit()
+    db.refresh(user)
+    user_cache.invalidate(user.username)
+    auth.mark_claims_stale(user.id)
     return user
 
+@app.get("/admin/users/{user_id}/sessions", response_model=List[schemas.SessionResponse])
+def get_user_sessions(
+    user_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """List a user's active sessions (admin only)"""
+    return sessions.list_sessions(db, user_id)
+
+@app.delete("/admin/users/{user_id}/sessions")
+def revoke_user_sessions(
+    user_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke every session of a user (admin only)"""
+    count = sessions.revoke_user_sessions(db, user_id)
+    return {"message": f"Revoked {count} session(s)"}
+
 @app.delete("/admin/users/{user_id}")
 def delete_user(
     user_id: int,
@@ -231,25 +645,116 @@ def delete_user(
             detail="Cannot delete your own account"
         )
     
+    username = user.username
+    stats.user_removed(db, user.is_active, user.auth_provider)
+    sessions.delete_user_sessions(db, [user.id])
     db.delete(user)
     db.commit()
+    user_cache.invalidate(username)
+    auth.mark_claims_stale(user_id)
     return {"message": "User deleted successfully"}
 
+def _filter_args(user_filter: Optional[schemas.UserFilter]) -> Optional[dict]:
+    if user_filter is None:
+        return None
+    return {"is_active": user_filter.is_active, "auth_provider": user_filter.auth_provider, "prefix": user_filter.q}
+
+@app.post("/admin/users/bulk/status", response_model=schemas.BulkOperationResult)
+def bulk_update_user_status(
+    request: schemas.BulkStatusUpdate,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Activate or deactivate users by id list or filter (admin only)"""
+    return bulk_admin.bulk_update_status(
+        db, request.is_active, current_admin.id, request.ids, _filter_args(request.filter)
+    )
+
+@app.post("/admin/users/bulk/delete", response_model=schemas.BulkOperationResult)
+def bulk_delete_users(
+    request: schemas.BulkTarget,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Delete users by id list or filter (admin only)
+
+    An explicit id list containing your own account is rejected; filters
+    simply never match it.
+    """
+    if request.ids is not None and current_admin.id in request.ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot delete your own account"
+        )
+    return bulk_admin.bulk_delete(db, current_admin.id, request.ids, _filter_args(request.filter))
+
 @app.get("/admin/stats", response_model=schemas.UserStats)
 def get_user_stats(
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Get user statistics (admin only)"""
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    inactive_users = total_users - active_users
-    
-    return {
-        "total_users": total_users,
-        "active_users": active_users,
-        "inactive_users": inactive_users
-    }
+    return stats.get_user_stats(db)
+
+@app.get("/admin/stats/hashing", response_model=schemas.HashingStats)
+def get_hashing_stats(current_admin: User = Depends(get_current_admin_user)):
+    """Get password hashing queue statistics (admin only)"""
+    return hasher.stats()
+
+@app.get("/admin/stats/cache", response_model=schemas.CacheStats)
+def get_cache_stats(current_admin: User = Depends(get_current_admin_user)):
+    """Get principal cache statistics (admin only)"""
+    return user_cache.stats()
+
+@app.get("/admin/stats/last-login", response_model=schemas.LastLoginStats)
+def get_last_login_stats(current_admin: User = Depends(get_current_admin_user)):
+    """Get last_login write-behind statistics (admin only)"""
+    return last_login_buffer.stats()
+
+@app.get("/admin/stats/db", response_model=schemas.DatabasePoolStats)
+def get_db_pool_stats(current_admin: User = Depends(get_current_admin_user)):
+    """Get database connection pool statistics (admin only)"""
+    return get_pool_stats()
+
+def collect_runtime_metrics():
+    """Expose the subsystem counters kept elsewhere at scrape time"""
+    hashing = hasher.stats()
+    yield "password_hash_queue_depth", "gauge", "Password hashes running or queued", {}, hashing["queue_depth"]
+    yield "password_hash_rejected_total", "counter", "Hash requests rejected with 503", {}, hashing["rejected"]
+    cache = user_cache.stats()
+    yield "principal_cache_size", "gauge", "Entries in the principal cache", {}, cache["size"]
+    yield "principal_cache_hits_total", "counter", "Principal cache hits", {}, cache["hits"]
+    yield "principal_cache_misses_total", "counter", "Principal cache misses", {}, cache["misses"]
+    pool = get_pool_stats()
+    yield "db_pool_checked_out", "gauge", "Database connections currently checked out", {}, pool["checked_out"]
+    yield "db_pool_overflow", "gauge", "Database connections open beyond the pool size", {}, pool["overflow"]
+    yield "db_pool_checkouts_total", "counter", "Database connection checkouts", {}, pool["checkouts"]
+    yield "db_pool_timeouts_total", "counter", "Database connection checkouts that timed out", {}, pool["timeouts"]
+    logins = last_login_buffer.stats()
+    yield "last_login_pending", "gauge", "last_login updates waiting to be flushed", {}, logins["pending"]
+    yield "last_login_dropped_total", "counter", "last_login updates dropped", {}, logins["dropped"]
+    yield "last_login_late_total", "counter", "last_login updates written late", {}, logins["late"]
+    limits = rate_limiter.stats()
+    yield "rate_limit_keys", "gauge", "Keys tracked by the rate limiter", {}, limits["keys"]
+    revocations = revocation_list.stats()
+    yield "revoked_tokens_tracked", "gauge", "Unexpired revoked tokens held in memory", {}, revocations["tracked"]
+    yield "revoked_token_sync_failures_total", "counter", "Failed syncs of the revocation list", {}, revocations["failures"]
+
+metrics.registry.register_collector(collect_runtime_metrics)
+
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+def read_jwks(request: Request):
+    """Public keys for verifying access tokens without calling this API"""
+    keyring = get_keyring()
+    headers = {"Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}", "ETag": keyring.jwks_etag}
+    if request.headers.get("if-none-match") == keyring.jwks_etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=keyring.jwks_json, media_type="application/json", headers=headers)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Metrics for this worker in the Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,221 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Every thread records into its own shard, so the hot path is a plain dict
+update with no lock; shards are only summed when /metrics is scraped.
+Values are per worker process: with several uvicorn workers, each one
+exposes its own counters.
+"""
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self):
+        self._definitions = {}
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str):
+        self._definitions[name] = ("counter", help_text, None)
+        return name
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self._definitions[name] = ("histogram", help_text, tuple(buckets))
+        return name
+
+    def register_collector(self, collect):
+        """Add a callable yielding (name, type, help, labels, value) samples at scrape time"""
+        self._collectors.append(collect)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            buckets = self._definitions[name][2]
+            # Per-bucket counts, then the +Inf bucket, sum and count
+            entry = histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        buckets = self._definitions[name][2]
+        entry[bisect.bisect_left(buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def time(self, name: str, labels: tuple = ()):
+        return _Timer(self, name, labels)
+
+    def _merged(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters = {}
+        histograms = {}
+        for shard in shards:
+            # dict.copy() is atomic under the GIL, so owners can keep writing
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, entry in shard.histograms.copy().items():
+                entry = list(entry)
+                merged = histograms.get(key)
+                histograms[key] = entry if merged is None else [a + b for a, b in zip(merged, entry)]
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self._merged()
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._definitions.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (sample, labels), value in sorted(counters.items()):
+                    if sample == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            else:
+                for (sample, labels), entry in sorted(histograms.items()):
+                    if sample != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float("inf"),), entry[:-2]):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(entry[-2])}")
+                    lines.append(f"{name}_count{_labels(labels)} {entry[-1]}")
+
+        seen = set()
+        for collect in self._collectors:
+            for name, kind, help_text, labels, value in collect():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(tuple(labels.items()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: Registry, name: str, labels: tuple):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+registry = Registry()
+
+# HTTP
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by method, route and status code")
+HTTP_DURATION = registry.histogram("http_request_duration_seconds", "HTTP request latency by method and route")
+
+# Authentication
+LOGINS = registry.counter("auth_logins_total", "Login attempts by method and result")
+TOKEN_FAILURES = registry.counter("auth_token_verification_failures_total", "Rejected bearer tokens by reason")
+HASH_DURATION = registry.histogram("password_hash_duration_seconds", "Password hash and verify time by operation")
+GOOGLE_VERIFY_DURATION = registry.histogram(
+    "google_token_verify_duration_seconds", "Google ID token verification latency"
+)
+GOOGLE_VERIFY_FAILURES = registry.counter("google_token_verify_failures_total", "Rejected Google ID tokens")
+RATE_LIMITED = registry.counter("rate_limited_requests_total", "Requests rejected with 429 by endpoint")
+
+# Database
+DB_POOL_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection"
+)
+DB_SLOW_QUERIES = registry.counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS")
+DB_REPEATED_QUERIES = registry.counter(
+    "db_repeated_queries_total", "Statements repeated N_PLUS_ONE_THRESHOLD times within one request"
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            # Routes are final once the app serves requests
+            self._route_paths = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint") and hasattr(route, "path")
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route_path(scope)
+            method = scope["method"]
+            registry.observe(HTTP_DURATION, time.perf_counter() - start, (("method", method), ("route", route)))
+            registry.inc(HTTP_REQUESTS, (("method", method), ("route", route), ("status", str(status_code))))
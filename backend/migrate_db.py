@@ -1,99 +1,444 @@
-import sqlite3
-import os
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the SQLite database
+
+Each step runs once, in order, and is recorded in the schema_migrations
+table, so a run against an up-to-date database is a single query. Steps
+are idempotent: they inspect the schema first and only change what is
+missing, which also lets them stamp databases created by create_tables().
+
+    python migrate_db.py                 # apply pending steps
+    python migrate_db.py --plan          # show pending steps without applying them
+    python migrate_db.py --rebuild-search-index
+    python migrate_db.py --rebuild-counters
+    python migrate_db.py --purge-sessions   # drop sessions expired or revoked over a week ago
+    python migrate_db.py --grant-admin alice # make an existing account an administrator
+"""
+import argparse
+import sys
+import time
 from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from database import DATABASE_URL, RevokedToken, User, UserCounter, UserSession, promote_default_admins
+
+# Rows copied per transaction when a table has to be rebuilt
+COPY_CHUNK_SIZE = 5000
+# Pause between copy chunks so the running app can take the write lock
+COPY_CHUNK_PAUSE = 0.05
+
+
+def create_migration_engine(database_url: str = None):
+    """Engine with real transactional DDL (pysqlite skips BEGIN for DDL by default)"""
+    engine = create_engine(database_url or DATABASE_URL, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def _columns(conn, table: str) -> dict:
+    return {row[1]: row for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).first() is not None
+
+
+def _ddl(element, conn) -> str:
+    return str(element.compile(dialect=conn.dialect)).strip()
+
+
+# --- Steps -----------------------------------------------------------------
+# Each step takes a connection and returns a list of changes it made.
+# Steps flagged as `manages_transactions` open their own transactions.
+
+def add_missing_columns(conn):
+    changes = []
+    columns = _columns(conn, "users")
+    additions = {
+        "created_at": "TIMESTAMP",
+        "last_login": "TIMESTAMP NULL",
+        "google_id": "TEXT NULL",
+        "profile_picture": "TEXT NULL",
+        "auth_provider": "TEXT DEFAULT 'local'",
+    }
+    for name, definition in additions.items():
+        if name not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE users ADD COLUMN {name} {definition}")
+            changes.append(f"added column {name}")
+    if "google_id" not in columns:
+        # SQLite cannot add a UNIQUE column, so enforce it with an index
+        conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_users_google_id ON users (google_id)")
+        changes.append("added unique index on google_id")
+    if conn.exec_driver_sql("UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL").rowcount:
+        changes.append("backfilled created_at")
+    if conn.exec_driver_sql("UPDATE users SET auth_provider = 'local' WHERE auth_provider IS NULL").rowcount:
+        changes.append("backfilled auth_provider")
+    return changes
+
+
+def hashed_password_nullable(conn):
+    """Google users have no password; old tables declared the column NOT NULL"""
+    column = _columns(conn, "users").get("hashed_password")
+    if column is None or not column[3]:
+        return []
+    rebuild_users_table(conn)
+    return ["rebuilt users table with nullable hashed_password"]
+
+
+hashed_password_nullable.manages_transactions = True
+
+
+def model_indexes(conn):
+    changes = []
+    existing = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(users)")}
+    for index in User.__table__.indexes:
+        if index.name not in existing:
+            conn.exec_driver_sql(_ddl(CreateIndex(index, if_not_exists=True), conn))
+            changes.append(f"created index {index.name}")
+    return changes
+
+
+def user_counters(conn):
+    if _table_exists(conn, UserCounter.__tablename__):
+        return []
+    conn.exec_driver_sql(_ddl(CreateTable(UserCounter.__table__), conn))
+    import stats
+    session = Session(bind=conn)
+    stats.rebuild_counters(session)
+    session.flush()
+    return ["created and seeded user_counters"]
+
+
+def search_index(conn):
+    import search
+    if not search.fts_supported(conn):
+        return []
+    if search.create_search_index(conn):
+        search.rebuild_search_index(conn)
+        return ["created and built users_fts"]
+    return []
+
+
+def user_roles(conn):
+    changes = []
+    if "role" not in _columns(conn, "users"):
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'user'")
+        changes.append("added column role")
+    # The first account was an administrator before roles existed. The column
+    # can already be there without any admin: step 2 rebuilds users from the
+    # model. Other administrators are granted with --grant-admin
+    promoted = promote_default_admins(conn)
+    if promoted:
+        changes.append("granted admin to user 1")
+    return changes
+
+
+def user_sessions(conn):
+    if _table_exists(conn, UserSession.__tablename__):
+        return []
+    conn.exec_driver_sql(_ddl(CreateTable(UserSession.__table__), conn))
+    for index in UserSession.__table__.indexes:
+        conn.exec_driver_sql(_ddl(CreateIndex(index), conn))
+    return ["created user_sessions"]
+
+
+def revoked_tokens(conn):
+    if _table_exists(conn, RevokedToken.__tablename__):
+        return []
+    conn.exec_driver_sql(_ddl(CreateTable(RevokedToken.__table__), conn))
+    for index in RevokedToken.__table__.indexes:
+        conn.exec_driver_sql(_ddl(CreateIndex(index), conn))
+    return ["created revoked_tokens"]
+
+
+def revoked_tokens_autoincrement(conn):
+    """Step 8 created revoked_tokens with reusable rowids; workers sync by id"""
+    table = RevokedToken.__tablename__
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return []
+    conn.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {table}_old")
+    for index in RevokedToken.__table__.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    conn.exec_driver_sql(_ddl(CreateTable(RevokedToken.__table__), conn))
+    for index in RevokedToken.__table__.indexes:
+        conn.exec_driver_sql(_ddl(CreateIndex(index), conn))
+    conn.exec_driver_sql(f"INSERT INTO {table} (id, jti, expires_at) SELECT id, jti, expires_at FROM {table}_old")
+    conn.exec_driver_sql(f"DROP TABLE {table}_old")
+    return ["rebuilt revoked_tokens with AUTOINCREMENT ids"]
+
+
+MIGRATIONS = [
+    (1, "Add SSO and timestamp columns", add_missing_columns),
+    (2, "Make hashed_password nullable", hashed_password_nullable),
+    (3, "Create model indexes", model_indexes),
+    (4, "Create user counters", user_counters),
+    (5, "Create full-text search index", search_index),
+    (6, "Add user roles", user_roles),
+    (7, "Create refresh-token sessions", user_sessions),
+    (8, "Create access-token denylist", revoked_tokens),
+    (9, "Stop reusing revoked_tokens ids", revoked_tokens_autoincrement),
+    # Databases whose step 6 ran after a step 2 rebuild were left without an admin
+    (10, "Restore the default administrator", user_roles),
+]
+
+
+# --- Online table rebuild --------------------------------------------------
+
+# Triggers mirroring writes to `users` into users_new during a rebuild
+COPY_TRIGGERS = ("users_copy_ai", "users_copy_au", "users_copy_ad")
+
+
+def rebuild_users_table(conn, chunk_size: int = None, pause: float = None):
+    """Rebuild `users` from the model definition without a long write lock.
+
+    Rows are copied into users_new in short chunked transactions while
+    triggers mirror concurrent writes to the old table. Only the final swap
+    (drop, rename, index creation) holds the lock for more than a chunk.
+    """
+    chunk_size = chunk_size or COPY_CHUNK_SIZE
+    pause = COPY_CHUNK_PAUSE if pause is None else pause
+    new_ddl = _ddl(CreateTable(User.__table__), conn).replace("CREATE TABLE users", "CREATE TABLE users_new", 1)
+
+    with conn.begin():
+        # Leftovers of a run that was killed before it could clean up
+        _drop_copy_objects(conn)
+        conn.exec_driver_sql(new_ddl)
+        new_columns = _columns(conn, "users_new")
+        columns = [name for name in _columns(conn, "users") if name in new_columns]
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{name}" for name in columns)
+        # Mirror writes that land while the copy is running
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER users_copy_ai AFTER INSERT ON users BEGIN
+                INSERT OR REPLACE INTO users_new ({column_list}) VALUES ({new_values});
+            END""")
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER users_copy_au AFTER UPDATE ON users BEGIN
+                INSERT OR REPLACE INTO users_new ({column_list}) VALUES ({new_values});
+            END""")
+        conn.exec_driver_sql("""
+            CREATE TRIGGER users_copy_ad AFTER DELETE ON users BEGIN
+                DELETE FROM users_new WHERE id = old.id;
+            END""")
 
-def migrate_database():
-    """Migrate the existing database to add new columns"""
-    db_path = "test.db"
-    
-    if not os.path.exists(db_path):
-        print("No existing database found. New database will be created automatically.")
-        return
-    
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Check if columns already exist
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add created_at column if it doesn't exist
-        if 'created_at' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
-            print("Added created_at column")
-        
-        # Add last_login column if it doesn't exist
-        if 'last_login' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN last_login TIMESTAMP NULL')
-            print("Added last_login column")
-        
-        # Add Google SSO columns
-        if 'google_id' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN google_id TEXT UNIQUE NULL')
-            print("Added google_id column")
-        
-        if 'profile_picture' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN profile_picture TEXT NULL')
-            print("Added profile_picture column")
-        
-        if 'auth_provider' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN auth_provider TEXT DEFAULT "local"')
-            print("Added auth_provider column")
-        
-        # Make hashed_password nullable for Google users
-        try:
-            # Create a new table with the correct schema
-            cursor.execute('''
-                CREATE TABLE users_new (
-                    id INTEGER PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    hashed_password TEXT NULL,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP NULL,
-                    google_id TEXT UNIQUE NULL,
-                    profile_picture TEXT NULL,
-                    auth_provider TEXT DEFAULT "local"
-                )
-            ''')
-            
-            # Copy data from old table
-            cursor.execute('''
-                INSERT INTO users_new (id, username, email, hashed_password, is_active, created_at, last_login, google_id, profile_picture, auth_provider)
-                SELECT id, username, email, hashed_password, is_active, 
-                       COALESCE(created_at, CURRENT_TIMESTAMP),
-                       last_login,
-                       COALESCE(google_id, NULL),
-                       COALESCE(profile_picture, NULL),
-                       COALESCE(auth_provider, "local")
-                FROM users
-            ''')
-            
-            # Drop old table and rename new one
-            cursor.execute('DROP TABLE users')
-            cursor.execute('ALTER TABLE users_new RENAME TO users')
-            print("Updated table schema for Google SSO")
-            
-        except sqlite3.Error as e:
-            print(f"Schema update not needed or failed: {e}")
-        
-        # Update existing users with current timestamp for created_at if null
-        cursor.execute('UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
-        cursor.execute('UPDATE users SET auth_provider = "local" WHERE auth_provider IS NULL')
-        
-        conn.commit()
-        conn.close()
-        print("Database migration completed successfully!")
-        
-    except Exception as e:
-        print(f"Migration failed: {e}")
-        print("Deleting old database to create fresh one...")
-        if 'conn' in locals():
-            conn.close()
-        os.remove(db_path)
-        print("Old database deleted. New database will be created on next startup.")
+        _copy_and_swap(conn, column_list, chunk_size, pause)
+    except BaseException:
+        # Leave `users` without triggers that would block the next run
+        with conn.begin():
+            _drop_copy_objects(conn)
+        raise
+
+
+def _drop_copy_objects(conn):
+    for trigger in COPY_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS users_new")
+
+
+def _copy_and_swap(conn, column_list: str, chunk_size: int, pause: float):
+    last_id = 0
+    copied = 0
+    while True:
+        with conn.begin():
+            row = conn.exec_driver_sql(
+                "SELECT max(id), count(*) FROM (SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?)",
+                (last_id, chunk_size),
+            ).first()
+            if not row[1]:
+                break
+            # OR IGNORE: a row mirrored by the triggers is already at least as new
+            conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO users_new ({column_list}) "
+                f"SELECT {column_list} FROM users WHERE id > ? AND id <= ?",
+                (last_id, row[0]),
+            )
+            last_id = row[0]
+            copied += row[1]
+        print(f"  copied {copied} rows")
+        time.sleep(pause)
+
+    with conn.begin():
+        for trigger in COPY_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        had_search_index = _table_exists(conn, "users_fts")
+        conn.exec_driver_sql("DROP TABLE users")
+        conn.exec_driver_sql("ALTER TABLE users_new RENAME TO users")
+        for index in User.__table__.indexes:
+            conn.exec_driver_sql(_ddl(CreateIndex(index, if_not_exists=True), conn))
+        if had_search_index:
+            # The search triggers were dropped along with the old table
+            import search
+            search.create_search_index(conn)
+            search.rebuild_search_index(conn)
+
+
+# --- Runner ----------------------------------------------------------------
+
+def _ensure_version_table(conn):
+    with conn.begin():
+        conn.exec_driver_sql("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL
+            )""")
+
+
+def _record(conn, version: int, name: str):
+    conn.exec_driver_sql(
+        "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+        (version, name, datetime.utcnow().isoformat(" ")),
+    )
+
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("SELECT coalesce(max(version), 0) FROM schema_migrations").scalar()
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def migrate_database(plan_only: bool = False, database_url: str = None) -> bool:
+    """Apply pending migrations; returns False if a step failed"""
+    database_url = database_url or DATABASE_URL
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        print("Migrations are only needed for SQLite; other databases are created by create_tables().")
+        return True
+
+    engine = create_migration_engine(database_url)
+    with engine.connect() as conn:
+        if not _table_exists(conn, "users"):
+            print("No existing database found. New database will be created automatically.")
+            return True
+        _ensure_version_table(conn)
+        pending = pending_migrations(conn)
+        if not pending:
+            print(f"Database is up to date (version {current_version(conn)}).")
+            return True
+
+        if plan_only:
+            rows = conn.exec_driver_sql("SELECT count(*) FROM users").scalar()
+            print(f"Current version {current_version(conn)}; {rows} users. Pending steps:")
+            for version, name, _ in pending:
+                print(f"  {version}: {name}")
+            return True
+
+        for version, name, step in pending:
+            print(f"Applying {version}: {name}")
+            try:
+                if getattr(step, "manages_transactions", False):
+                    changes = step(conn)
+                    with conn.begin():
+                        _record(conn, version, name)
+                else:
+                    with conn.begin():
+                        changes = step(conn)
+                        _record(conn, version, name)
+            except Exception as e:
+                # Other steps run in one transaction, which was rolled back. A
+                # table rebuild drops its copy; `users` itself is only swapped
+                # in its last transaction. Either way the step can be rerun
+                print(f"Migration {version} failed: {e}")
+                return False
+            for change in changes:
+                print(f"  {change}")
+            if not changes:
+                print("  already up to date")
+    print("Database migration completed successfully!")
+    return True
+
+
+def rebuild_search_index():
+    """Recreate the full-text search index from the users table"""
+    import search
+    engine = create_migration_engine()
+    with engine.connect() as conn:
+        if not search.fts_supported(conn):
+            print("Full-text search is not supported by this database")
+            return
+        with conn.begin():
+            search.create_search_index(conn)
+            search.rebuild_search_index(conn)
+    print("Search index rebuilt")
+
+
+def rebuild_counters():
+    """Recompute the /admin/stats counters from the users table"""
+    import stats
+    engine = create_migration_engine()
+    with engine.connect() as conn:
+        with conn.begin():
+            session = Session(bind=conn)
+            stats.rebuild_counters(session)
+            session.flush()
+    print("User counters rebuilt")
+
+
+def purge_sessions():
+    """Delete refresh-token sessions that can no longer be used"""
+    import sessions
+    engine = create_migration_engine()
+    with engine.connect() as conn:
+        with conn.begin():
+            count = sessions.purge_sessions(Session(bind=conn))
+    print(f"Purged {count} sessions")
+
+
+def grant_admin(username: str) -> bool:
+    """Give an existing account the admin role"""
+    engine = create_migration_engine()
+    with engine.connect() as conn:
+        with conn.begin():
+            users = User.__table__
+            granted = conn.execute(
+                users.update().where(users.c.username == username).values(role="admin")
+            ).rowcount
+    if not granted:
+        print(f"No user named {username!r}")
+        return False
+    # Tokens already issued to the account carry its old role until they expire
+    print(f"{username} is now an administrator")
+    return True
+
 
 if __name__ == "__main__":
-    migrate_database()
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--plan", "--dry-run", action="store_true", help="Show pending steps and exit")
+    parser.add_argument("--chunk-size", type=int, default=COPY_CHUNK_SIZE,
+                        help="Rows per transaction when a table is rebuilt")
+    parser.add_argument("--rebuild-search-index", action="store_true")
+    parser.add_argument("--rebuild-counters", action="store_true")
+    parser.add_argument("--purge-sessions", action="store_true")
+    parser.add_argument("--grant-admin", metavar="USERNAME", help="Make an existing account an administrator")
+    args = parser.parse_args()
+
+    COPY_CHUNK_SIZE = args.chunk_size
+    ok = migrate_database(plan_only=args.plan)
+    if ok and not args.plan:
+        if args.rebuild_search_index:
+            rebuild_search_index()
+        if args.rebuild_counters:
+            rebuild_counters()
+        if args.purge_sessions:
+            purge_sessions()
+        if args.grant_admin:
+            ok = grant_admin(args.grant_admin)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, or_, tuple_
+
+from database import User
+
+# Upper bound used to turn a prefix into an index-friendly range predicate
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+SORT_KEYS = ("id", "created_at")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(user: User, sort: str) -> str:
+    """Build an opaque cursor pointing just after the given row"""
+    payload = {"s": sort, "id": user.id}
+    if sort == "created_at":
+        payload["c"] = user.created_at.isoformat() if user.created_at else None
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort or not isinstance(payload["id"], int):
+            raise InvalidCursor("Cursor does not match the requested sort order")
+        if sort == "created_at" and payload.get("c") is not None:
+            payload["c"] = datetime.fromisoformat(payload["c"])
+        return payload
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+
+
+def prefix_filter(column, prefix: str):
+    """Prefix match as a range scan so the column's B-tree index is used"""
+    return and_(column >= prefix, column < prefix + PREFIX_UPPER_BOUND)
+
+
+def filter_users(query, is_active: Optional[bool] = None, auth_provider: Optional[str] = None,
+                 prefix: Optional[str] = None):
+    """Apply the admin list filters to a User query"""
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    if auth_provider:
+        query = query.filter(User.auth_provider == auth_provider)
+    if prefix:
+        query = query.filter(or_(prefix_filter(User.username, prefix), prefix_filter(User.email, prefix)))
+    return query
+
+
+def seek(query, sort: str, cursor: Optional[str]):
+    """Order a User query by the sort key and seek past the cursor"""
+    if sort == "created_at":
+        query = query.order_by(User.created_at, User.id)
+    else:
+        query = query.order_by(User.id)
+    if not cursor:
+        return query
+    position = decode_cursor(cursor, sort)
+    if sort == "created_at" and position.get("c") is not None:
+        return query.filter(tuple_(User.created_at, User.id) > (position["c"], position["id"]))
+    return query.filter(User.id > position["id"])
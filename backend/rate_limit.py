@@ -0,0 +1,244 @@
+"""
+Sliding-window throttling for the credential endpoints.
+
+Checks run before any user lookup or password hash, so a flood of guesses
+is rejected for the cost of a dict lookup instead of a bcrypt verify.
+
+Two backends:
+- "memory": per worker process, bounded LRU of keys (default)
+- "sqlite": a local SQLite file shared by every worker on the host
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_settings
+import metrics
+
+settings = get_settings()
+
+# Rate limit settings
+RATE_LIMIT_ENABLED = settings.rate_limit_enabled
+RATE_LIMIT_BACKEND = settings.rate_limit_backend
+RATE_LIMIT_SQLITE_PATH = settings.rate_limit_sqlite_path
+RATE_LIMIT_WINDOW_SECONDS = settings.rate_limit_window_seconds
+# Keys tracked by the memory backend before the least recently used are evicted
+RATE_LIMIT_MAX_KEYS = settings.rate_limit_max_keys
+# Attempts allowed per window
+LOGIN_IP_LIMIT = settings.login_ip_limit
+LOGIN_USERNAME_LIMIT = settings.login_username_limit
+SIGNUP_IP_LIMIT = settings.signup_ip_limit
+# Take the client address from X-Forwarded-For (only behind a trusted proxy)
+RATE_LIMIT_TRUST_PROXY = settings.rate_limit_trust_proxy
+
+
+class RateLimited(Exception):
+    """Raised when a request is over one of its limits"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _slide(state, now: float, window: float):
+    """Move a (window_start, current, previous) state to the window containing now"""
+    window_start = now - now % window
+    if state is None:
+        return window_start, 0, 0
+    start, current, previous = state
+    if start == window_start:
+        return state
+    if start == window_start - window:
+        return window_start, 0, current
+    return window_start, 0, 0
+
+
+def _retry_after(state, now: float, window: float, limit: int) -> int:
+    """Seconds until the weighted count drops below the limit, or 0 if it already is"""
+    window_start, current, previous = state
+    weight = 1 - (now - window_start) / window
+    if previous * weight + current < limit:
+        return 0
+    if current >= limit or not previous:
+        # Only the next window resets the count
+        return max(1, math.ceil(window_start + window - now))
+    # previous * (1 - (t - window_start) / window) + current < limit
+    allowed_at = window_start + window * (1 - (limit - current) / previous)
+    return max(1, math.ceil(allowed_at - now))
+
+
+class MemoryBackend:
+    """Sliding-window counters for one worker process"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, rules, now: float) -> int:
+        """Count one attempt against every rule, unless one of them is exhausted.
+
+        `rules` is a list of (key, limit, window). Returns 0 when allowed,
+        otherwise the Retry-After for the most restrictive rule.
+        """
+        with self._lock:
+            states = [_slide(self._states.get(key), now, window) for key, _, window in rules]
+            retry_after = max(
+                _retry_after(state, now, window, limit) for state, (_, limit, window) in zip(states, rules)
+            )
+            if retry_after:
+                return retry_after
+            for state, (key, _, _) in zip(states, rules):
+                window_start, current, previous = state
+                self._states[key] = (window_start, current + 1, previous)
+                self._states.move_to_end(key)
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+                self.evictions += 1
+            return 0
+
+    def size(self) -> int:
+        return len(self._states)
+
+
+class SQLiteBackend:
+    """Sliding-window counters in a SQLite file shared by all local workers"""
+
+    # Hits between sweeps of keys that no longer affect any decision
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        self._max_window = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    window_start REAL NOT NULL,
+                    current INTEGER NOT NULL,
+                    previous INTEGER NOT NULL
+                )""")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, rules, now: float) -> int:
+        conn = self._connection()
+        keys = [key for key, _, _ in rules]
+        self._max_window = max([self._max_window] + [window for _, _, window in rules])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT key, window_start, current, previous FROM rate_limits "
+                f"WHERE key IN ({', '.join('?' for _ in keys)})",
+                keys,
+            ).fetchall()
+            stored = {row[0]: tuple(row[1:]) for row in rows}
+            states = [_slide(stored.get(key), now, window) for key, _, window in rules]
+            retry_after = max(
+                _retry_after(state, now, window, limit) for state, (_, limit, window) in zip(states, rules)
+            )
+            if not retry_after:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limits (key, window_start, current, previous) VALUES (?, ?, ?, ?)",
+                    [(key, state[0], state[1] + 1, state[2]) for state, (key, _, _) in zip(states, rules)],
+                )
+            self._hits += 1
+            if self._hits % self.PRUNE_INTERVAL == 0:
+                conn.execute("DELETE FROM rate_limits WHERE window_start < ?", (now - 2 * self._max_window,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+class RateLimiter:
+    """Per-IP and per-username limits for login and signup"""
+
+    def __init__(self, backend=None, enabled: bool = RATE_LIMIT_ENABLED,
+                 window: float = RATE_LIMIT_WINDOW_SECONDS):
+        if backend is None:
+            backend = BACKENDS[RATE_LIMIT_BACKEND]()
+        self.backend = backend
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+
+    def _check(self, endpoint: str, rules):
+        if not self.enabled:
+            return
+        retry_after = self.backend.hit(rules, time.time())
+        with self._lock:
+            if retry_after:
+                self.throttled += 1
+            else:
+                self.allowed += 1
+        if retry_after:
+            metrics.registry.inc(metrics.RATE_LIMITED, (("endpoint", endpoint),))
+            raise RateLimited(retry_after)
+
+    def check_login(self, ip: str, username: str):
+        self._check("login", [
+            (f"login:ip:{ip}", LOGIN_IP_LIMIT, self.window),
+            (f"login:user:{username.strip().lower()[:256]}", LOGIN_USERNAME_LIMIT, self.window),
+        ])
+
+    def check_signup(self, ip: str):
+        self._check("signup", [(f"signup:ip:{ip}", SIGNUP_IP_LIMIT, self.window)])
+
+    async def check_login_async(self, ip: str, username: str):
+        if isinstance(self.backend, MemoryBackend):
+            self.check_login(ip, username)
+        else:
+            # Keep the SQLite write lock off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.check_login, ip, username)
+
+    async def check_signup_async(self, ip: str):
+        if isinstance(self.backend, MemoryBackend):
+            self.check_signup(ip)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self.check_signup, ip)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": type(self.backend).__name__,
+                "keys": self.backend.size(),
+                "allowed": self.allowed,
+                "throttled": self.throttled,
+            }
+
+
+def client_ip(request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,194 @@
+"""
+Access-token denylist.
+
+Logging out records the token's `jti` in the revoked_tokens table. Every
+worker keeps the unexpired entries in memory and a background thread pulls
+rows added by other workers once per REVOCATION_SYNC_SECONDS, so checking a
+token never queries the database:
+
+- a bloom filter answers "never revoked" for almost every token
+- a dict of jti -> exp confirms the rare filter hits
+- a heap ordered by exp drops entries once the token has expired anyway;
+  the filter cannot forget keys, so it is rebuilt after enough evictions
+
+A revocation reaches other workers within REVOCATION_SYNC_SECONDS.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from typing import Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from config import get_settings
+from database import RevokedToken, engine
+
+settings = get_settings()
+
+REVOCATION_SYNC_SECONDS = settings.revocation_sync_seconds
+# Bloom filter size; at the default 2^20 bits and 7 hashes, 100k live
+# revocations give about 1% false positives, each costing one dict lookup
+REVOCATION_BLOOM_BITS = settings.revocation_bloom_bits
+REVOCATION_BLOOM_HASHES = settings.revocation_bloom_hashes
+# How often one worker deletes rows of tokens that have expired
+REVOCATION_PURGE_SECONDS = 600
+# Ids below the highest one seen that every sync reads again. On PostgreSQL
+# and MySQL concurrent logouts can commit out of id order; this must exceed
+# the revocations that can be in flight at once across all workers
+REVOCATION_SYNC_OVERLAP = 1024
+
+_revoked = RevokedToken.__table__
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings"""
+
+    def __init__(self, bits: int = REVOCATION_BLOOM_BITS, hashes: int = REVOCATION_BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves of one digest
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """In-memory view of revoked_tokens, kept current by a background thread"""
+
+    def __init__(self, interval: float = REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        self._bloom = BloomFilter()
+        self._expiry = {}
+        self._heap = []
+        self._evicted_since_rebuild = 0
+        self._last_id = 0
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.syncs = 0
+        self.failures = 0
+        self.hits = 0
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            # Issued before tokens carried a jti
+            return False
+        self._ensure_started()
+        if jti not in self._bloom:
+            return False
+        expires_at = self._expiry.get(jti)
+        if expires_at is None or expires_at <= time.time():
+            return False
+        self.hits += 1
+        return True
+
+    def revoke(self, jti: str, expires_at: float):
+        """Deny a token until expires_at, here at once and in other workers after their next sync"""
+        if expires_at <= time.time():
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(_revoked), {"jti": jti, "expires_at": int(expires_at)})
+        except IntegrityError:
+            # Already revoked, by this worker or another
+            pass
+        with self._lock:
+            self._add(jti, expires_at)
+
+    def _add(self, jti: str, expires_at: float) -> bool:
+        if jti in self._expiry:
+            return False
+        self._expiry[jti] = expires_at
+        heapq.heappush(self._heap, (expires_at, jti))
+        self._bloom.add(jti)
+        return True
+
+    def _evict(self, now: float):
+        evicted = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, jti = heapq.heappop(self._heap)
+            del self._expiry[jti]
+            evicted += 1
+        self._evicted_since_rebuild += evicted
+        if self._evicted_since_rebuild > max(1024, len(self._expiry)):
+            bloom = BloomFilter(self._bloom.bits, self._bloom.hashes)
+            for jti in self._expiry:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._evicted_since_rebuild = 0
+
+    def sync(self) -> int:
+        """Load revocations added since the last sync and evict expired ones"""
+        now = time.time()
+        # Ids are never reused (AUTOINCREMENT), but a lower one can still become
+        # visible after a higher one; _add skips the rows already loaded
+        query = select(_revoked.c.id, _revoked.c.jti, _revoked.c.expires_at).where(
+            _revoked.c.id > self._last_id - REVOCATION_SYNC_OVERLAP,
+            _revoked.c.expires_at > now,
+        )
+        try:
+            with engine.begin() as conn:
+                rows = conn.execute(query.order_by(_revoked.c.id)).fetchall()
+                if now - self._last_purge >= REVOCATION_PURGE_SECONDS:
+                    conn.execute(_revoked.delete().where(_revoked.c.expires_at <= now))
+                    self._last_purge = now
+        except Exception as e:
+            self.failures += 1
+            print(f"Syncing revoked tokens failed: {e}")
+            return 0
+        added = 0
+        with self._lock:
+            for row_id, jti, expires_at in rows:
+                added += self._add(jti, expires_at)
+                self._last_id = max(self._last_id, row_id)
+            self._evict(now)
+            self.syncs += 1
+        return added
+
+    def start(self):
+        """Load the current revocations, then keep syncing in the background"""
+        with self._lock:
+            if self._thread is not None or self._stopped.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+        self.sync()
+        self._thread.start()
+
+    def _ensure_started(self):
+        if self._thread is None and not self._stopped.is_set():
+            self.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sync()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 5)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked": len(self._expiry),
+                "hits": self.hits,
+                "syncs": self.syncs,
+                "failures": self.failures,
+            }
+
+
+revocation_list = RevocationList()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, validator
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -20,6 +20,35 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    # Also end the login this refresh token belongs to
+    refresh_token: Optional[str] = None
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str]
+
+class IntrospectResult(BaseModel):
+    # Only `active` is set for tokens that are invalid, expired, revoked or of inactive users
+    active: bool
+    sub: Optional[str] = None
+    uid: Optional[int] = None
+    role: Optional[str] = None
+    exp: Optional[int] = None
+
+class SessionResponse(BaseModel):
+    id: int
+    created_at: datetime
+    expires_at: datetime
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+
+    class Config:
+        orm_mode = True
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -42,15 +71,108 @@ class UserResponseExtended(UserResponse):
     google_id: Optional[str] = None
     profile_picture: Optional[str] = None
     auth_provider: Optional[str] = "local"
+    role: str = "user"
 
 # New schemas for user management
 class UserStatusUpdate(BaseModel):
     is_active: bool
 
+class UserRoleUpdate(BaseModel):
+    role: str
+
+    @validator("role")
+    def known_role(cls, value):
+        if value not in ("user", "admin", "introspector"):
+            raise ValueError("role must be user, admin or introspector")
+        return value
+
 class UserStats(BaseModel):
     total_users: int
     active_users: int
     inactive_users: int
+    by_auth_provider: Dict[str, int] = {}
+    logins_last_24h: int = 0
+    logins_last_7d: int = 0
+    logins_last_30d: int = 0
 
 class AdminUserResponse(UserResponseExtended):
     last_login: Optional[datetime] = None
+
+class HashingStats(BaseModel):
+    workers: int
+    queue_size: int
+    queue_depth: int
+    completed: int
+    rejected: int
+    avg_latency_ms: float
+    max_latency_ms: float
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+class LastLoginStats(BaseModel):
+    pending: int
+    flushed: int
+    batches: int
+    dropped: int
+    late: int
+    failures: int
+
+class DatabasePoolStats(BaseModel):
+    backend: str
+    pool_size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+class ImportIssue(BaseModel):
+    row: int
+    type: str  # "conflict" or "error"
+    field: Optional[str] = None
+    value: Optional[str] = None
+    message: Optional[str] = None
+
+class ImportReport(BaseModel):
+    processed: int
+    inserted: int
+    conflicts: int
+    errors: int
+    issues: List[ImportIssue] = []
+
+# Bulk admin operations
+class UserFilter(BaseModel):
+    is_active: Optional[bool] = None
+    auth_provider: Optional[str] = None
+    q: Optional[str] = None  # Username or email prefix
+
+    @validator("q", always=True)
+    def at_least_one_field(cls, v, values):
+        if v is None and values.get("is_active") is None and values.get("auth_provider") is None:
+            raise ValueError("filter must set at least one of is_active, auth_provider or q")
+        return v
+
+class BulkTarget(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[UserFilter] = None
+
+    @validator("filter", always=True)
+    def ids_or_filter(cls, v, values):
+        if (v is None) == (values.get("ids") is None):
+            raise ValueError("provide exactly one of ids or filter")
+        return v
+
+class BulkStatusUpdate(BulkTarget):
+    is_active: bool
+
+class BulkOperationResult(BaseModel):
+    matched: int
+    affected: int
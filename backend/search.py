@@ -0,0 +1,161 @@
+import re
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import pagination
+from database import engine, User
+
+# FTS5 shadow table over the searchable user columns. It is an external
+# content table, so it stores only the index and reads rows from `users`.
+FTS_TABLE = "users_fts"
+
+_CREATE_FTS = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    username, email, auth_provider,
+    content='users', content_rowid='id', prefix='2 3'
+)
+"""
+
+# Triggers keep the index in step with every write, including bulk statements
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, username, email, auth_provider)
+        VALUES (new.id, new.username, new.email, new.auth_provider);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email, auth_provider)
+        VALUES ('delete', old.id, old.username, old.email, old.auth_provider);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email, auth_provider ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email, auth_provider)
+        VALUES ('delete', old.id, old.username, old.email, old.auth_provider);
+        INSERT INTO {FTS_TABLE}(rowid, username, email, auth_provider)
+        VALUES (new.id, new.username, new.email, new.auth_provider);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_enabled = False
+
+
+def fts_supported(connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    try:
+        options = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")}
+    except Exception:
+        return False
+    return "ENABLE_FTS5" in options
+
+
+def create_search_index(connection) -> bool:
+    """Create the FTS5 table and triggers; returns True if the table is new"""
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).first()
+    connection.exec_driver_sql(_CREATE_FTS)
+    for statement in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(statement)
+    return exists is None
+
+
+def rebuild_search_index(connection):
+    """Re-read every row of `users` into the FTS index"""
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_search_index(create: bool = True):
+    """Set up full-text search when the database supports it.
+
+    With create=False the index is only looked up, for worker processes
+    whose schema was initialised by the launcher.
+    """
+    global _fts_enabled
+    with engine.begin() as connection:
+        if not fts_supported(connection):
+            _fts_enabled = False
+            return
+        if not create:
+            _fts_enabled = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+            ).first() is not None
+            return
+        if create_search_index(connection):
+            # Index the rows that existed before the table did
+            rebuild_search_index(connection)
+    _fts_enabled = True
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _match_expression(q: str) -> Optional[str]:
+    # Quote each token so user input cannot inject FTS5 query syntax
+    tokens = _TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _exact_matches(db: Session, q: str, auth_provider: Optional[str]) -> List[User]:
+    """Users whose username or email is exactly q, found on the unique indexes"""
+    users = []
+    for column in (User.username, User.email):
+        query = db.query(User).filter(column == q)
+        if auth_provider:
+            query = query.filter(User.auth_provider == auth_provider)
+        user = query.first()
+        if user is not None and user not in users:
+            users.append(user)
+    return users
+
+
+def _ranked_ids(db: Session, match: str, exclude: List[int], limit: int, offset: int) -> List[int]:
+    # Only rowids come out of the index; users rows are read for the page alone
+    excluded = f"AND rowid NOT IN ({', '.join(str(user_id) for user_id in exclude)})" if exclude else ""
+    sql = f"""
+        SELECT rowid FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match {excluded}
+        ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0)
+        LIMIT :limit OFFSET :offset
+    """
+    params = {"match": match, "limit": limit, "offset": offset}
+    return [row[0] for row in db.execute(text(sql), params)]
+
+
+def search_users(db: Session, q: str, auth_provider: Optional[str] = None,
+                 limit: int = 20, offset: int = 0) -> List[User]:
+    """Ranked user search over username, email and auth_provider
+
+    An exact username or email hit comes first, then the FTS5 matches by
+    bm25 rank (username weighted over email over provider).
+    """
+    if _fts_enabled:
+        match = _match_expression(q)
+        if match is None:
+            return []
+        if auth_provider:
+            # Filter inside the index rather than on the joined rows
+            match = f"({match}) AND auth_provider : {_quote(auth_provider)}"
+        exact = _exact_matches(db, q, auth_provider)
+        page = exact[offset:offset + limit]
+        if len(page) < limit:
+            ids = _ranked_ids(
+                db, match, [user.id for user in exact], limit - len(page), max(0, offset - len(exact))
+            )
+            users = {user.id: user for user in db.query(User).filter(User.id.in_(ids))} if ids else {}
+            page += [users[user_id] for user_id in ids if user_id in users]
+        return page
+
+    # Without FTS5, fall back to indexed prefix matching
+    query = pagination.filter_users(db.query(User), auth_provider=auth_provider, prefix=q)
+    return query.order_by(User.username).offset(offset).limit(limit).all()
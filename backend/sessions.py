@@ -0,0 +1,147 @@
+"""
+Refresh-token sessions.
+
+A login creates a session holding the SHA-256 of a random refresh token;
+the token itself is only ever sent to the client. Each refresh rotates it:
+the presented session is revoked and a new one is created in the same
+family. Presenting an already rotated token means it was copied, so the
+whole family is revoked. Refreshing costs one indexed lookup and no
+password hashing.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from database import User, UserSession
+
+settings = get_settings()
+
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+
+
+class RefreshError(Exception):
+    """Raised when a refresh token cannot be exchanged"""
+    pass
+
+
+def _hash_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, so a fast hash is enough
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(db: Session, user_id: int, family_id: Optional[str] = None,
+                   user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> str:
+    """Add a session to the caller's transaction and return its refresh token"""
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    db.add(UserSession(
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4().hex,
+        token_hash=_hash_token(token),
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        user_agent=user_agent[:256] if user_agent else None,
+        ip_address=ip_address,
+    ))
+    return token
+
+
+def _revoke(query, reason: str) -> int:
+    return query.filter(UserSession.revoked_at.is_(None)).update(
+        {UserSession.revoked_at: datetime.utcnow(), UserSession.revoke_reason: reason},
+        synchronize_session=False,
+    )
+
+
+def rotate(db: Session, token: str, user_agent: Optional[str] = None,
+           ip_address: Optional[str] = None) -> Tuple[User, str]:
+    """Exchange a refresh token for a new one; returns the user and the new token"""
+    row = db.query(UserSession, User).join(User, User.id == UserSession.user_id).filter(
+        UserSession.token_hash == _hash_token(token)
+    ).first()
+    if row is None:
+        raise RefreshError("Invalid refresh token")
+    session, user = row
+
+    # The conditional update also catches two concurrent refreshes of one token
+    if session.revoked_at is not None or not _revoke(
+        db.query(UserSession).filter(UserSession.id == session.id), "rotated"
+    ):
+        if session.revoke_reason in (None, "rotated"):
+            # A rotated token came back: assume it leaked and end the whole login
+            _revoke(db.query(UserSession).filter(UserSession.family_id == session.family_id), "reuse")
+            db.commit()
+            raise RefreshError("Refresh token reuse detected")
+        raise RefreshError("Refresh token revoked")
+    if session.expires_at <= datetime.utcnow():
+        db.rollback()
+        raise RefreshError("Refresh token expired")
+    if not user.is_active:
+        db.rollback()
+        raise RefreshError("Inactive user")
+
+    new_token = create_session(db, user.id, session.family_id, user_agent, ip_address)
+    db.commit()
+    return user, new_token
+
+
+def list_sessions(db: Session, user_id: int) -> List[UserSession]:
+    """The live session of each of the user's logins, newest first"""
+    return db.query(UserSession).filter(
+        UserSession.user_id == user_id,
+        UserSession.revoked_at.is_(None),
+        UserSession.expires_at > datetime.utcnow(),
+    ).order_by(UserSession.created_at.desc()).all()
+
+
+def revoke_session(db: Session, user_id: int, session_id: int, reason: str = "revoked") -> bool:
+    """Revoke the login a session belongs to; False if it is not the user's"""
+    family_id = db.query(UserSession.family_id).filter(
+        UserSession.id == session_id, UserSession.user_id == user_id
+    ).scalar()
+    if family_id is None:
+        return False
+    _revoke(db.query(UserSession).filter(UserSession.family_id == family_id), reason)
+    db.commit()
+    return True
+
+
+def revoke_token(db: Session, token: str, reason: str = "logout") -> bool:
+    """Revoke the login a refresh token belongs to"""
+    family_id = db.query(UserSession.family_id).filter(
+        UserSession.token_hash == _hash_token(token)
+    ).scalar()
+    if family_id is None:
+        return False
+    _revoke(db.query(UserSession).filter(UserSession.family_id == family_id), reason)
+    db.commit()
+    return True
+
+
+def revoke_user_sessions(db: Session, user_id: int, reason: str = "revoked") -> int:
+    count = _revoke(db.query(UserSession).filter(UserSession.user_id == user_id), reason)
+    db.commit()
+    return count
+
+
+def delete_user_sessions(db: Session, user_ids: List[int]):
+    """Remove the sessions of deleted users inside the caller's transaction.
+
+    The foreign key cascades too, but only where the database enforces it
+    (SQLite needs PRAGMA foreign_keys, which in-memory databases skip).
+    """
+    db.query(UserSession).filter(UserSession.user_id.in_(user_ids)).delete(synchronize_session=False)
+
+
+def purge_sessions(db: Session, older_than_days: int = 7) -> int:
+    """Delete sessions that expired or were revoked more than older_than_days ago"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    count = db.query(UserSession).filter(
+        (UserSession.expires_at < cutoff) | (UserSession.revoked_at < cutoff)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return count
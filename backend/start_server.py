@@ -1,18 +1,23 @@
 #!/usr/bin/env python3
 """
-Simple startup script for the FastAPI backend with error handling
+Startup script for the FastAPI backend
+
+    python start_server.py                 # production: one worker per core
+    python start_server.py --workers 4     # explicit worker count (or WEB_CONCURRENCY)
+    python start_server.py --reload        # development: single process, auto-reload
+    python start_server.py --check         # run dependency checks before starting
+
+The master process applies migrations and creates the schema once, then
+binds the socket and spawns the workers, which skip schema initialisation.
+On SIGTERM or Ctrl+C the workers stop accepting connections, finish the
+requests in flight and run their shutdown hooks before exiting.
 """
+import argparse
 import os
 import sys
+import time
 
-def main():
-    print("🚀 Starting FastAPI Authentication Backend...\n")
-    
-    # Check if we're in the right directory
-    if not os.path.exists("main.py"):
-        print("❌ Error: main.py not found. Please run this from the backend directory.")
-        return
-    
+def run_checks() -> bool:
     # Check if virtual environment is activated by checking for required packages
     try:
         import fastapi
@@ -22,43 +27,96 @@ def main():
         print(f"❌ Missing package: {e}")
         print("Please install dependencies:")
         print("   pip install -r requirements.txt")
-        return
-    
+        return False
+
     # Test password hashing
     try:
         from auth import get_password_hash
-        test_hash = get_password_hash("test")
+        get_password_hash("test")
         print("✅ Password hashing working")
     except Exception as e:
         print(f"❌ Password hashing error: {e}")
         print("Bcrypt may not be installed. Try: pip install bcrypt")
-        return
-    
-    # Create database tables
+        return False
+    return True
+
+def init_schema() -> bool:
+    """Apply migrations and create missing tables, once for all workers"""
     try:
-        from database import create_tables
-        create_tables()
+        from migrate_db import migrate_database
+        if not migrate_database():
+            return False
+        import database
+        import search
+        import stats
+        database.create_tables()
+        stats.ensure_counters()
+        search.ensure_search_index()
+        # Workers open their own connections
+        database.engine.dispose()
         print("✅ Database initialized")
+        return True
     except Exception as e:
         print(f"❌ Database error: {e}")
-        return
-    
-    print("\n🎉 All checks passed! Starting server...\n")
+        return False
+
+def main():
+    from config import get_settings
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Start the authentication backend")
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.web_concurrency or os.cpu_count() or 1,
+                        help="Worker processes (default: WEB_CONCURRENCY or the number of cores)")
+    parser.add_argument("--reload", action="store_true", help="Single process with auto-reload for development")
+    parser.add_argument("--check", action="store_true", help="Check dependencies and password hashing first")
+    args = parser.parse_args()
+
+    launched_at = time.time()
+    print("🚀 Starting FastAPI Authentication Backend...\n")
+
+    # Check if we're in the right directory
+    if not os.path.exists("main.py"):
+        print("❌ Error: main.py not found. Please run this from the backend directory.")
+        sys.exit(1)
+
+    if args.check and not run_checks():
+        sys.exit(1)
+
+    if not init_schema():
+        sys.exit(1)
+
+    workers = 1 if args.reload else max(1, args.workers)
+    # Workers inherit the environment: skip schema init and report readiness
+    os.environ["SKIP_SCHEMA_INIT"] = "true"
+    os.environ["SERVER_LAUNCHED_AT"] = str(launched_at)
+    # Split the cores between the workers' password hashing pools
+    os.environ.setdefault("HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    mode = "development (auto-reload)" if args.reload else f"production, {workers} worker(s)"
+    print(f"\n🎉 Master ready in {time.time() - launched_at:.2f}s. Starting server in {mode}...\n")
     print("🌐 Server will be available at:")
-    print("   - API: http://localhost:8000")
-    print("   - Docs: http://localhost:8000/docs")
-    print("   - ReDoc: http://localhost:8000/redoc")
+    print(f"   - API: http://localhost:{args.port}")
+    print(f"   - Docs: http://localhost:{args.port}/docs")
+    print(f"   - ReDoc: http://localhost:{args.port}/redoc")
     print("\n⏹️ Press Ctrl+C to stop the server\n")
-    
-    # Start the server
+
+    # Start the server; an import string lets uvicorn import the app in each worker
     try:
         import uvicorn
-        from main import app
-        uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=args.reload,
+            workers=None if args.reload else workers,
+        )
     except KeyboardInterrupt:
         print("\n👋 Server stopped")
     except Exception as e:
         print(f"\n❌ Server error: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from config import get_settings
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, User, UserCounter
+
+settings = get_settings()
+
+# How long the recent-login aggregate is reused between dashboard refreshes
+STATS_CACHE_SECONDS = settings.stats_cache_seconds
+
+LOGIN_WINDOWS = {
+    "logins_last_24h": timedelta(hours=24),
+    "logins_last_7d": timedelta(days=7),
+    "logins_last_30d": timedelta(days=30),
+}
+
+_login_cache = {"expires_at": 0.0, "value": None}
+_login_cache_lock = threading.Lock()
+
+
+def _provider_key(provider) -> str:
+    return f"provider:{provider or 'local'}"
+
+
+def adjust(db: Session, deltas: dict):
+    """Apply counter deltas inside the caller's transaction with one UPDATE"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = db.query(UserCounter).filter(UserCounter.name.in_(deltas)).update(
+        {UserCounter.value: UserCounter.value + case(deltas, value=UserCounter.name, else_=0)},
+        synchronize_session=False,
+    )
+    if updated < len(deltas):
+        # First user of a new provider: create the counters the UPDATE missed
+        existing = {name for (name,) in db.query(UserCounter.name).filter(UserCounter.name.in_(deltas))}
+        db.add_all([UserCounter(name=name, value=delta) for name, delta in deltas.items() if name not in existing])
+        db.flush()
+
+
+def user_added(db: Session, is_active: bool = True, auth_provider: str = "local"):
+    adjust(db, {"total": 1, "active": 1 if is_active else 0, _provider_key(auth_provider): 1})
+
+
+def user_removed(db: Session, is_active: bool, auth_provider: str):
+    adjust(db, {"total": -1, "active": -1 if is_active else 0, _provider_key(auth_provider): -1})
+
+
+def status_changed(db: Session, was_active: bool, is_active: bool):
+    if bool(was_active) != bool(is_active):
+        adjust(db, {"active": 1 if is_active else -1})
+
+
+def provider_changed(db: Session, old_provider: str, new_provider: str):
+    if _provider_key(old_provider) != _provider_key(new_provider):
+        adjust(db, {_provider_key(old_provider): -1, _provider_key(new_provider): 1})
+
+
+def rebuild_counters(db: Session):
+    """Recompute every counter from the users table in a single pass"""
+    rows = db.query(
+        User.auth_provider, func.count(User.id), func.sum(case((User.is_active == True, 1), else_=0))
+    ).group_by(User.auth_provider).all()
+    values = {"total": 0, "active": 0}
+    for provider, total, active in rows:
+        values["total"] += total
+        values["active"] += active or 0
+        key = _provider_key(provider)
+        values[key] = values.get(key, 0) + total
+    db.query(UserCounter).delete(synchronize_session=False)
+    db.add_all([UserCounter(name=name, value=value) for name, value in values.items()])
+
+
+def ensure_counters():
+    """Seed the counters table once if it has never been populated"""
+    db = SessionLocal()
+    try:
+        if db.query(UserCounter).first() is None:
+            rebuild_counters(db)
+            db.commit()
+    except IntegrityError:
+        # Another worker seeded it first
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _recent_logins(db: Session) -> dict:
+    now = time.monotonic()
+    with _login_cache_lock:
+        if _login_cache["value"] is not None and _login_cache["expires_at"] > now:
+            return _login_cache["value"]
+    # One range scan over ix_users_last_login covers every window
+    utcnow = datetime.utcnow()
+    widest = max(LOGIN_WINDOWS.values())
+    columns = [
+        func.coalesce(func.sum(case((User.last_login >= utcnow - window, 1), else_=0)), 0)
+        for window in LOGIN_WINDOWS.values()
+    ]
+    row = db.query(*columns).filter(User.last_login >= utcnow - widest).one()
+    value = dict(zip(LOGIN_WINDOWS.keys(), row))
+    with _login_cache_lock:
+        _login_cache["value"] = value
+        _login_cache["expires_at"] = now + STATS_CACHE_SECONDS
+    return value
+
+
+def get_user_stats(db: Session) -> dict:
+    counters = {c.name: c.value for c in db.query(UserCounter).all()}
+    total = counters.get("total", 0)
+    active = counters.get("active", 0)
+    by_provider = {
+        name.split(":", 1)[1]: value
+        for name, value in counters.items()
+        if name.startswith("provider:") and value
+    }
+    result = {
+        "total_users": total,
+        "active_users": active,
+        "inactive_users": total - active,
+        "by_auth_provider": by_provider,
+    }
+    result.update(_recent_logins(db))
+    return result
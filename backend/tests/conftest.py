@@ -0,0 +1,75 @@
+"""
+Shared setup for the backend tests.
+
+    cd backend && python -m pytest
+
+Settings are read once per process when the backend modules are first
+imported, so the environment is prepared here, before any of them are.
+Every test run gets its own temporary SQLite database.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+_data_dir = tempfile.mkdtemp(prefix="auth-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir}/test.db"
+os.environ["SECRET_KEY"] = "test-secret-key"
+os.environ["ALGORITHM"] = "HS256"
+os.environ["AUTH_MODE"] = "database"
+os.environ["ASYNC_API"] = "false"
+os.environ["SKIP_SCHEMA_INIT"] = "false"
+# Tests that exercise throttling build their own limiter
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN = {"username": "root", "email": "root@example.com", "password": "pw-123456"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    # Entering the client runs the startup and shutdown hooks
+    with TestClient(main.app) as test_client:
+        # The first account in the empty database is its administrator
+        response = test_client.post("/signup", json=ADMIN)
+        assert response.status_code == 200, response.text
+        yield test_client
+
+
+@pytest.fixture
+def admin_token(client):
+    response = client.post("/login", json={"username": ADMIN["username"], "password": ADMIN["password"]})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def new_user(client):
+    """Sign up a fresh user and return (username, login response)"""
+    def create():
+        username = f"user_{uuid.uuid4().hex[:12]}"
+        response = client.post(
+            "/signup", json={"username": username, "email": f"{username}@example.com", "password": "pw-123456"}
+        )
+        assert response.status_code == 200, response.text
+        response = client.post("/login", json={"username": username, "password": "pw-123456"})
+        assert response.status_code == 200, response.text
+        return username, response.json()
+    return create
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def user_id(client, token: str) -> int:
+    response = client.get("/me", headers=bearer(token))
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
@@ -0,0 +1,111 @@
+import uuid
+
+import pytest
+
+import bulk_admin
+from conftest import ADMIN, bearer, user_id
+from database import SessionLocal
+
+
+@pytest.fixture
+def group(client):
+    """Ids of three users sharing a fresh username prefix, and the prefix"""
+    base = f"bk{uuid.uuid4().hex[:8]}"
+    ids = []
+    for i in range(3):
+        username = f"{base}_{i}"
+        response = client.post(
+            "/signup", json={"username": username, "email": f"{username}@example.com", "password": "pw-123456"}
+        )
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids, base
+
+
+def _post(client, admin_token: str, operation: str, body: dict):
+    return client.post(f"/admin/users/bulk/{operation}", json=body, headers=bearer(admin_token))
+
+
+def _is_active(client, admin_token: str, target: int) -> bool:
+    return client.get(f"/admin/users/{target}", headers=bearer(admin_token)).json()["is_active"]
+
+
+def test_status_by_ids_reports_matched_and_changed(client, admin_token, group):
+    ids, _ = group
+    response = _post(client, admin_token, "status", {"ids": ids[:2] + [10 ** 9], "is_active": False})
+    assert response.json() == {"matched": 2, "affected": 2}
+    assert [_is_active(client, admin_token, target) for target in ids] == [False, False, True]
+
+    response = _post(client, admin_token, "status", {"ids": ids, "is_active": False})
+    assert response.json() == {"matched": 3, "affected": 1}
+
+
+def test_status_by_filter(client, admin_token, group):
+    ids, base = group
+    response = _post(client, admin_token, "status", {"filter": {"q": base}, "is_active": False})
+    assert response.json() == {"matched": 3, "affected": 3}
+    response = _post(client, admin_token, "status", {"filter": {"q": base, "is_active": False}, "is_active": True})
+    assert response.json() == {"matched": 3, "affected": 3}
+    assert all(_is_active(client, admin_token, target) for target in ids)
+
+
+def test_status_never_changes_the_calling_admin(client, admin_token):
+    admin_id = user_id(client, admin_token)
+    for body in ({"ids": [admin_id]}, {"filter": {"q": ADMIN["username"]}}):
+        response = _post(client, admin_token, "status", dict(body, is_active=False))
+        assert response.json() == {"matched": 0, "affected": 0}
+    assert client.get("/admin/stats", headers=bearer(admin_token)).status_code == 200
+
+
+def test_delete_by_ids_and_filter(client, admin_token, group):
+    ids, base = group
+    response = _post(client, admin_token, "delete", {"ids": ids[:1]})
+    assert response.json() == {"matched": 1, "affected": 1}
+    response = _post(client, admin_token, "delete", {"filter": {"q": base}})
+    assert response.json() == {"matched": 2, "affected": 2}
+    assert all(
+        client.get(f"/admin/users/{target}", headers=bearer(admin_token)).status_code == 404 for target in ids
+    )
+
+
+def test_delete_ends_the_users_sessions(client, admin_token, new_user):
+    _, tokens = new_user()
+    target = user_id(client, tokens["access_token"])
+    assert _post(client, admin_token, "delete", {"ids": [target]}).json()["affected"] == 1
+    response = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_delete_never_removes_the_calling_admin(client, admin_token):
+    admin_id = user_id(client, admin_token)
+    assert _post(client, admin_token, "delete", {"ids": [admin_id]}).status_code == 400
+    response = _post(client, admin_token, "delete", {"filter": {"q": ADMIN["username"]}})
+    assert response.json() == {"matched": 0, "affected": 0}
+    assert user_id(client, admin_token) == admin_id
+
+
+@pytest.mark.parametrize("body", [
+    {"is_active": False},
+    {"ids": [1], "filter": {"q": "x"}, "is_active": False},
+    {"filter": {}, "is_active": False},
+])
+def test_targets_are_validated(client, admin_token, body):
+    assert _post(client, admin_token, "status", body).status_code == 422
+
+
+def test_bulk_operations_require_an_admin(client, new_user):
+    _, tokens = new_user()
+    response = _post(client, tokens["access_token"], "status", {"ids": [1], "is_active": False})
+    assert response.status_code == 403
+
+
+def test_targets_are_walked_in_chunks(client, group):
+    ids, base = group
+    db = SessionLocal()
+    try:
+        by_filter = list(bulk_admin.iter_target_chunks(db, filters={"prefix": base}, chunk_size=2))
+        by_ids = list(bulk_admin.iter_target_chunks(db, ids=ids + ids, exclude_id=ids[0], chunk_size=2))
+    finally:
+        db.close()
+    assert [[row.id for row in rows] for rows in by_filter] == [ids[:2], ids[2:]]
+    assert [[row.id for row in rows] for rows in by_ids] == [ids[1:2], ids[2:]]
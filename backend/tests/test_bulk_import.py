@@ -0,0 +1,69 @@
+import tempfile
+import uuid
+
+import auth
+import bulk_import
+from conftest import bearer
+from hashing import PasswordHasher
+
+
+def _spooled(data: bytes):
+    # What UploadFile.file is; io.TextIOWrapper cannot wrap it before Python 3.11
+    stream = tempfile.SpooledTemporaryFile(max_size=1024)
+    stream.write(data)
+    stream.seek(0)
+    return stream
+
+
+def test_iter_rows_reads_csv_from_an_upload():
+    data = 'username,email\r\n"jö\nse",jose@example.com\r\nbob,bob@example.com\r\n'.encode()
+    rows = list(bulk_import.iter_rows(_spooled(data), "csv"))
+    assert rows == [
+        {"username": "jö\nse", "email": "jose@example.com"},
+        {"username": "bob", "email": "bob@example.com"},
+    ]
+
+
+def test_iter_rows_skips_blank_ndjson_lines():
+    data = b'{"username": "a"}\n\n{"username": "b"}\n'
+    assert list(bulk_import.iter_rows(_spooled(data), "ndjson")) == ['{"username": "a"}', '{"username": "b"}']
+
+
+def test_import_endpoint_inserts_and_reports_conflicts(client, admin_token, monkeypatch):
+    import main
+    # One worker for imports whatever the number of cores here
+    hasher = PasswordHasher(workers=2, queue_size=8, import_workers=1)
+    monkeypatch.setattr(main, "hasher", hasher)
+    name = f"imported_{uuid.uuid4().hex[:8]}"
+    lines = [
+        f'{{"username": "{name}", "email": "{name}@example.com", "password": "pw-123456"}}',
+        f'{{"username": "{name}", "email": "other-{name}@example.com", "password": "pw-123456"}}',
+        "not json",
+    ]
+    response = client.post(
+        "/admin/users/import?format=ndjson",
+        files={"file": ("users.ndjson", "\n".join(lines).encode(), "application/x-ndjson")},
+        headers=bearer(admin_token),
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["conflicts"], report["errors"]) == (3, 1, 1, 1)
+    assert client.post("/login", json={"username": name, "password": "pw-123456"}).status_code == 200
+    hasher.shutdown()
+
+
+def test_single_hash_worker_is_kept_for_logins():
+    hasher = PasswordHasher(workers=1, queue_size=4, import_workers=0)
+    name = f"imported_{uuid.uuid4().hex[:8]}"
+    rows = [
+        {"username": f"{name}_plain", "email": f"{name}_plain@example.com", "password": "pw-123456"},
+        {"username": f"{name}_hashed", "email": f"{name}_hashed@example.com",
+         "hashed_password": auth.get_password_hash("pw-123456")},
+    ]
+    try:
+        report = bulk_import.import_users(rows, executor=hasher)
+    finally:
+        hasher.shutdown()
+    assert (report.inserted, report.error_count) == (1, 1)
+    assert "hashed_password" in report.issues[0]["message"]
+    assert hasher.stats()["completed"] == 0
@@ -0,0 +1,71 @@
+import pytest
+
+import main
+from conftest import bearer, user_id
+
+
+@pytest.fixture
+def gateway(client, new_user, admin_token):
+    """Access token of an account with the introspector role"""
+    username, tokens = new_user()
+    target = user_id(client, tokens["access_token"])
+    response = client.put(
+        f"/admin/users/{target}/role", json={"role": "introspector"}, headers=bearer(admin_token)
+    )
+    assert response.status_code == 200, response.text
+    return client.post("/login", json={"username": username, "password": "pw-123456"}).json()["access_token"]
+
+
+def _introspect(client, gateway: str, tokens: list):
+    response = client.post("/auth/introspect", json={"tokens": tokens}, headers=bearer(gateway))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_results_follow_the_request_order(client, gateway, new_user):
+    first_name, first = new_user()
+    second_name, second = new_user()
+    tokens = [second["access_token"], "garbage", first["access_token"], second["access_token"]]
+
+    results = _introspect(client, gateway, tokens)
+    assert [result["active"] for result in results] == [True, False, True, True]
+    assert [result.get("sub") for result in results] == [second_name, None, first_name, second_name]
+    assert results[1] == {"active": False}
+    assert results[0]["uid"] == user_id(client, second["access_token"])
+    assert results[0]["role"] == "user" and results[0]["exp"]
+
+
+def test_inactive_deleted_and_revoked_users_are_not_active(client, gateway, new_user, admin_token):
+    _, inactive = new_user()
+    _, deleted = new_user()
+    _, logged_out = new_user()
+    admin = bearer(admin_token)
+    inactive_id = user_id(client, inactive["access_token"])
+    deleted_id = user_id(client, deleted["access_token"])
+    # Cache the principals first: the changes below must still be seen
+    _introspect(client, gateway, [inactive["access_token"], deleted["access_token"]])
+
+    client.put(f"/admin/users/{inactive_id}/status", json={"is_active": False}, headers=admin)
+    client.delete(f"/admin/users/{deleted_id}", headers=admin)
+    client.post("/logout", headers=bearer(logged_out["access_token"]))
+
+    tokens = [inactive["access_token"], deleted["access_token"], logged_out["access_token"]]
+    assert _introspect(client, gateway, tokens) == [{"active": False}] * 3
+
+
+def test_only_introspectors_may_call_it(client, new_user, admin_token):
+    _, tokens = new_user()
+    for caller in (admin_token, tokens["access_token"]):
+        response = client.post("/auth/introspect", json={"tokens": []}, headers=bearer(caller))
+        assert response.status_code == 403
+    assert client.post("/auth/introspect", json={"tokens": []}).status_code in (401, 403)
+
+
+def test_batches_are_bounded(client, gateway):
+    tokens = ["x"] * (main.INTROSPECT_MAX_TOKENS + 1)
+    response = client.post("/auth/introspect", json={"tokens": tokens}, headers=bearer(gateway))
+    assert response.status_code == 413
+
+
+def test_the_introspector_role_grants_nothing_else(client, gateway):
+    assert client.get("/admin/stats", headers=bearer(gateway)).status_code == 403
@@ -0,0 +1,182 @@
+import sqlite3
+
+import pytest
+
+import migrate_db
+
+# The users table as the first release created it
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY,
+    username VARCHAR UNIQUE,
+    email VARCHAR UNIQUE,
+    hashed_password VARCHAR NOT NULL,
+    is_active BOOLEAN DEFAULT 1
+)
+"""
+
+LEGACY_USERS = [
+    (1, "root", "root@example.com", "hash-1", 1),
+    (2, "Admin", "admin@example.com", "hash-2", 1),
+    (3, "bob", "bob@example.com", "hash-3", 0),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", LEGACY_USERS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _url(path) -> str:
+    return f"sqlite:///{path}"
+
+
+def _table_sql(conn, table: str) -> str:
+    return conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+
+
+def test_legacy_database_migrates_to_current_schema(legacy_db):
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+
+    conn = sqlite3.connect(legacy_db)
+    latest = migrate_db.MIGRATIONS[-1][0]
+    assert conn.execute("SELECT max(version) FROM schema_migrations").fetchone()[0] == latest
+
+    columns = {row[1]: row for row in conn.execute("PRAGMA table_info(users)")}
+    for name in ("created_at", "last_login", "google_id", "profile_picture", "auth_provider", "role"):
+        assert name in columns
+    # Rebuilt so Google users can have no password
+    assert columns["hashed_password"][3] == 0
+
+    rows = conn.execute("SELECT id, username, hashed_password, is_active, auth_provider FROM users ORDER BY id")
+    assert [tuple(row) for row in rows] == [
+        (1, "root", "hash-1", 1, "local"),
+        (2, "Admin", "hash-2", 1, "local"),
+        (3, "bob", "hash-3", 0, "local"),
+    ]
+
+
+def test_legacy_database_keeps_its_administrators(legacy_db):
+    # Step 2 rebuilds users with a role column, so step 6 must still backfill
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+
+    conn = sqlite3.connect(legacy_db)
+    roles = dict(conn.execute("SELECT username, role FROM users"))
+    # The username grants nothing; other admins are named explicitly
+    assert roles == {"root": "admin", "Admin": "user", "bob": "user"}
+
+
+def test_grant_admin_promotes_a_named_account(legacy_db, monkeypatch):
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+    monkeypatch.setattr(migrate_db, "DATABASE_URL", _url(legacy_db))
+
+    assert migrate_db.grant_admin("bob")
+    assert not migrate_db.grant_admin("nobody")
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("SELECT role FROM users WHERE username = 'bob'").fetchone()[0] == "admin"
+
+
+def test_legacy_database_gets_counters_and_new_tables(legacy_db):
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+
+    conn = sqlite3.connect(legacy_db)
+    counters = dict(conn.execute("SELECT name, value FROM user_counters"))
+    assert counters["total"] == 3
+    assert counters["active"] == 2
+    assert counters["provider:local"] == 3
+    assert _table_sql(conn, "user_sessions")
+    assert "AUTOINCREMENT" in _table_sql(conn, "revoked_tokens").upper()
+
+
+def test_migrations_are_idempotent(legacy_db, capsys):
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+    capsys.readouterr()
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+    assert "up to date" in capsys.readouterr().out
+
+
+def test_plan_does_not_change_the_database(legacy_db, capsys):
+    assert migrate_db.migrate_database(plan_only=True, database_url=_url(legacy_db))
+    assert "Pending steps" in capsys.readouterr().out
+
+    conn = sqlite3.connect(legacy_db)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    assert "role" not in columns
+    assert conn.execute("SELECT count(*) FROM schema_migrations").fetchone()[0] == 0
+
+
+def test_revoked_tokens_from_step_8_are_rebuilt_with_autoincrement(legacy_db, monkeypatch):
+    url = _url(legacy_db)
+    monkeypatch.setattr(migrate_db, "MIGRATIONS", [m for m in migrate_db.MIGRATIONS if m[0] <= 7])
+    assert migrate_db.migrate_database(database_url=url)
+    monkeypatch.undo()
+
+    # The table as step 8 first created it: plain, reusable rowids
+    conn = sqlite3.connect(legacy_db)
+    conn.execute(
+        "CREATE TABLE revoked_tokens (id INTEGER NOT NULL PRIMARY KEY, jti VARCHAR NOT NULL UNIQUE, "
+        "expires_at INTEGER NOT NULL)"
+    )
+    conn.execute("CREATE INDEX ix_revoked_tokens_expires_at ON revoked_tokens (expires_at)")
+    conn.execute("INSERT INTO revoked_tokens VALUES (5, 'jti-5', 4102444800)")
+    conn.execute("INSERT INTO schema_migrations VALUES (8, 'Create access-token denylist', '2026-01-01')")
+    conn.commit()
+    conn.close()
+
+    assert migrate_db.migrate_database(database_url=url)
+
+    conn = sqlite3.connect(legacy_db)
+    assert "AUTOINCREMENT" in _table_sql(conn, "revoked_tokens").upper()
+    assert conn.execute("SELECT id, jti FROM revoked_tokens").fetchall() == [(5, "jti-5")]
+    # A purge of the highest id must not let a new row take it again
+    conn.execute("DELETE FROM revoked_tokens")
+    conn.execute("INSERT INTO revoked_tokens (jti, expires_at) VALUES ('jti-new', 4102444800)")
+    assert conn.execute("SELECT id FROM revoked_tokens").fetchone()[0] > 5
+
+
+def _copy_objects(conn) -> list:
+    return conn.execute(
+        "SELECT name FROM sqlite_master WHERE name LIKE 'users_copy_%' OR name = 'users_new' ORDER BY name"
+    ).fetchall()
+
+
+def test_interrupted_rebuild_can_be_rerun(legacy_db, monkeypatch):
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(migrate_db, "COPY_CHUNK_SIZE", 1)
+    monkeypatch.setattr(migrate_db.time, "sleep", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        migrate_db.migrate_database(database_url=_url(legacy_db))
+
+    conn = sqlite3.connect(legacy_db)
+    assert _copy_objects(conn) == []
+    assert conn.execute("SELECT count(*) FROM users").fetchone()[0] == len(LEGACY_USERS)
+    conn.close()
+
+    monkeypatch.undo()
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("SELECT count(*) FROM users").fetchone()[0] == len(LEGACY_USERS)
+    assert _copy_objects(conn) == []
+
+
+def test_rebuild_recovers_from_a_killed_run(legacy_db):
+    # What a run killed mid-copy leaves behind
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("CREATE TABLE users_new (id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TRIGGER users_copy_ai AFTER INSERT ON users BEGIN INSERT INTO users_new (id) VALUES (new.id); END")
+    conn.execute("CREATE TRIGGER users_copy_ad AFTER DELETE ON users BEGIN DELETE FROM users_new WHERE id = old.id; END")
+    conn.commit()
+    conn.close()
+
+    assert migrate_db.migrate_database(database_url=_url(legacy_db))
+    conn = sqlite3.connect(legacy_db)
+    assert _copy_objects(conn) == []
+    assert conn.execute("SELECT count(*) FROM users").fetchone()[0] == len(LEGACY_USERS)
@@ -0,0 +1,71 @@
+import uuid
+
+import pytest
+
+from conftest import bearer
+
+
+@pytest.fixture
+def prefix(client):
+    """Five local users sharing a fresh username prefix"""
+    base = f"pg{uuid.uuid4().hex[:8]}"
+    for i in range(5):
+        username = f"{base}_{i}"
+        response = client.post(
+            "/signup", json={"username": username, "email": f"{username}@example.com", "password": "pw-123456"}
+        )
+        assert response.status_code == 200, response.text
+    return base
+
+
+def _walk(client, admin_token: str, **params):
+    """Follow X-Next-Cursor to the end and return the usernames in order"""
+    usernames = []
+    cursor = None
+    while True:
+        page_params = dict(params, cursor=cursor) if cursor else params
+        response = client.get("/admin/users", params=page_params, headers=bearer(admin_token))
+        assert response.status_code == 200, response.text
+        usernames += [user["username"] for user in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return usernames
+
+
+@pytest.mark.parametrize("sort", ["id", "created_at"])
+def test_cursor_pages_cover_every_row_once(client, admin_token, prefix, sort):
+    usernames = _walk(client, admin_token, q=prefix, limit=2, sort=sort)
+    assert usernames == [f"{prefix}_{i}" for i in range(5)]
+
+
+def test_filters_apply_to_every_page(client, admin_token, prefix):
+    users = client.get("/admin/users", params={"q": prefix}, headers=bearer(admin_token)).json()
+    inactive = users[2]["id"]
+    response = client.put(
+        f"/admin/users/{inactive}/status", json={"is_active": False}, headers=bearer(admin_token)
+    )
+    assert response.status_code == 200
+
+    active = _walk(client, admin_token, q=prefix, limit=2, is_active=True)
+    assert active == [f"{prefix}_{i}" for i in (0, 1, 3, 4)]
+    assert _walk(client, admin_token, q=prefix, is_active=False) == [f"{prefix}_2"]
+    assert _walk(client, admin_token, q=prefix, auth_provider="google") == []
+
+
+def test_skip_is_kept_without_a_cursor(client, admin_token, prefix):
+    response = client.get("/admin/users", params={"q": prefix, "skip": 3}, headers=bearer(admin_token))
+    assert [user["username"] for user in response.json()] == [f"{prefix}_3", f"{prefix}_4"]
+
+
+def test_cursor_must_match_the_sort_order(client, admin_token, prefix):
+    response = client.get("/admin/users", params={"q": prefix, "limit": 2}, headers=bearer(admin_token))
+    cursor = response.headers["x-next-cursor"]
+    response = client.get(
+        "/admin/users", params={"q": prefix, "cursor": cursor, "sort": "created_at"}, headers=bearer(admin_token)
+    )
+    assert response.status_code == 400
+
+
+def test_malformed_cursor_is_rejected(client, admin_token):
+    response = client.get("/admin/users", params={"cursor": "not-a-cursor"}, headers=bearer(admin_token))
+    assert response.status_code == 400
@@ -0,0 +1,96 @@
+import pytest
+
+import rate_limit
+from rate_limit import MemoryBackend, RateLimited, RateLimiter, SQLiteBackend
+
+WINDOW = 60.0
+
+
+def _rules(key: str = "login:ip:10.0.0.1", limit: int = 2):
+    return [(key, limit, WINDOW)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "limits.db"))
+
+
+def test_allows_up_to_the_limit_then_rejects(backend):
+    assert backend.hit(_rules(), 0.0) == 0
+    assert backend.hit(_rules(), 1.0) == 0
+    retry_after = backend.hit(_rules(), 2.0)
+    # Nothing older than the current window to slide out: wait for the next one
+    assert retry_after == 58
+
+
+def test_previous_window_is_weighted_out(backend):
+    backend.hit(_rules(), 0.0)
+    backend.hit(_rules(), 1.0)
+    # At the start of the next window the previous two still count fully
+    assert backend.hit(_rules(), 60.0) > 0
+    # Halfway through, they count as one
+    assert backend.hit(_rules(), 90.0) == 0
+
+
+def test_rejected_attempts_are_not_counted(backend):
+    backend.hit(_rules(limit=1), 0.0)
+    for now in (1.0, 2.0, 3.0):
+        assert backend.hit(_rules(limit=1), now) > 0
+    # Two windows later the key starts fresh
+    assert backend.hit(_rules(limit=1), 120.0) == 0
+
+
+def test_every_rule_must_allow_the_attempt(backend):
+    rules = [("login:ip:10.0.0.1", 10, WINDOW), ("login:user:bob", 1, WINDOW)]
+    assert backend.hit(rules, 0.0) == 0
+    assert backend.hit(rules, 1.0) > 0
+    # The blocked attempt did not use up the IP's allowance
+    assert backend.hit([("login:ip:10.0.0.1", 2, WINDOW)], 2.0) == 0
+
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    assert first.hit(_rules(), 0.0) == 0
+    assert second.hit(_rules(), 1.0) == 0
+    assert first.hit(_rules(), 2.0) > 0
+
+
+def test_memory_backend_evicts_least_recently_used_keys():
+    backend = MemoryBackend(max_keys=2)
+    backend.hit(_rules("a"), 0.0)
+    backend.hit(_rules("b"), 0.0)
+    backend.hit(_rules("c"), 0.0)
+    assert backend.size() == 2
+    assert backend.evictions == 1
+
+
+def test_limiter_raises_with_retry_after():
+    limiter = RateLimiter(MemoryBackend(), enabled=True)
+    for _ in range(rate_limit.SIGNUP_IP_LIMIT):
+        limiter.check_signup("10.0.0.2")
+    with pytest.raises(RateLimited) as excinfo:
+        limiter.check_signup("10.0.0.2")
+    assert excinfo.value.retry_after >= 1
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_login_is_limited_per_username_across_addresses():
+    limiter = RateLimiter(MemoryBackend(), enabled=True)
+    for i in range(rate_limit.LOGIN_USERNAME_LIMIT):
+        limiter.check_login(f"10.0.1.{i}", "Bob")
+    with pytest.raises(RateLimited):
+        limiter.check_login("10.0.2.1", " bob ")
+
+
+def test_login_endpoint_returns_429(client, monkeypatch):
+    monkeypatch.setattr(rate_limit.rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limit.rate_limiter, "backend", MemoryBackend())
+    credentials = {"username": "nobody", "password": "wrong"}
+    for _ in range(rate_limit.LOGIN_USERNAME_LIMIT):
+        assert client.post("/login", json=credentials).status_code == 401
+    response = client.post("/login", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
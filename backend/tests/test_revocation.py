@@ -0,0 +1,128 @@
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+import revocation
+from conftest import bearer
+
+
+def _jti() -> str:
+    return uuid.uuid4().hex
+
+
+@pytest.fixture
+def worker():
+    """A RevocationList standing in for another worker process"""
+    lists = []
+
+    def create():
+        revocations = revocation.RevocationList(interval=3600)
+        lists.append(revocations)
+        return revocations
+
+    yield create
+    for revocations in lists:
+        revocations.stop()
+
+
+def test_logout_revokes_the_access_token(client, new_user):
+    _, tokens = new_user()
+    headers = bearer(tokens["access_token"])
+    assert client.get("/me", headers=headers).status_code == 200
+
+    assert client.post("/logout", headers=headers).status_code == 200
+    assert client.get("/me", headers=headers).status_code == 401
+
+
+def test_logout_without_a_token_still_succeeds(client):
+    assert client.post("/logout").status_code == 200
+    assert client.post("/logout", json={}).status_code == 200
+
+
+def test_revocation_reaches_other_workers(worker):
+    a, b = worker(), worker()
+    b.start()
+    jti = _jti()
+    a.revoke(jti, time.time() + 60)
+    assert a.is_revoked(jti)
+    assert not b.is_revoked(jti)
+
+    b.sync()
+    assert b.is_revoked(jti)
+
+
+def test_revocation_after_a_purge_reaches_other_workers(worker):
+    a, b = worker(), worker()
+    b.start()
+    short_lived = _jti()
+    a.revoke(short_lived, time.time() + 0.5)
+    b.sync()
+    time.sleep(0.6)
+    # Purge the expired row, which held the highest id
+    b._last_purge = 0
+    b.sync()
+
+    jti = _jti()
+    a.revoke(jti, time.time() + 60)
+    b.sync()
+    assert b.is_revoked(jti)
+
+
+def test_new_worker_loads_existing_revocations(worker):
+    jti = _jti()
+    worker().revoke(jti, time.time() + 60)
+    late = worker()
+    late.start()
+    assert late.is_revoked(jti)
+
+
+def test_revoking_twice_is_harmless(worker):
+    a = worker()
+    jti = _jti()
+    a.revoke(jti, time.time() + 60)
+    a.revoke(jti, time.time() + 60)
+    assert a.is_revoked(jti)
+
+
+def test_expired_entries_are_evicted_and_live_ones_kept(worker):
+    a = worker()
+    a.start()
+    live = _jti()
+    now = time.time()
+    with a._lock:
+        for i in range(3000):
+            a._add(f"expired-{i}", now - 1)
+        a._add(live, now + 60)
+        a._evict(now)
+
+    # The bloom filter was rebuilt without the evicted keys
+    assert a._evicted_since_rebuild == 0
+    assert "expired-0" not in a._bloom
+    assert "expired-0" not in a._expiry
+    assert a.is_revoked(live)
+    assert not a.is_revoked("expired-0")
+
+
+def test_tokens_without_jti_are_not_revoked(worker):
+    assert not worker().is_revoked(None)
+
+
+def test_revocation_committed_out_of_id_order_reaches_other_workers(worker):
+    b = worker()
+    b.start()
+    late, early = _jti(), _jti()
+    expires_at = int(time.time() + 60)
+    table = revocation._revoked
+    with revocation.engine.begin() as conn:
+        top = conn.execute(select(func.max(table.c.id))).scalar() or 0
+        conn.execute(table.insert(), {"id": top + 10, "jti": late, "expires_at": expires_at})
+    b.sync()
+    assert b.is_revoked(late)
+
+    # A concurrent logout given a lower id commits after the higher one was synced
+    with revocation.engine.begin() as conn:
+        conn.execute(table.insert(), {"id": top + 5, "jti": early, "expires_at": expires_at})
+    assert b.sync() == 1
+    assert b.is_revoked(early)
@@ -0,0 +1,32 @@
+from conftest import bearer
+
+
+def test_the_username_admin_grants_nothing(client):
+    response = client.post("/signup", json={"username": "Admin", "email": "admin@example.com", "password": "pw-123456"})
+    assert response.status_code == 200, response.text
+    assert response.json()["role"] == "user"
+
+    tokens = client.post("/login", json={"username": "Admin", "password": "pw-123456"}).json()
+    assert client.get("/admin/stats", headers=bearer(tokens["access_token"])).status_code == 403
+
+
+def test_new_users_are_not_admins(client, new_user):
+    _, tokens = new_user()
+    assert client.get("/me", headers=bearer(tokens["access_token"])).json()["role"] == "user"
+
+
+def test_the_first_account_is_the_administrator(client, admin_token):
+    assert client.get("/me", headers=bearer(admin_token)).json()["role"] == "admin"
+    assert client.get("/admin/stats", headers=bearer(admin_token)).status_code == 200
+
+
+def test_admins_grant_roles_but_not_to_themselves(client, new_user, admin_token):
+    _, tokens = new_user()
+    user_id = client.get("/me", headers=bearer(tokens["access_token"])).json()["id"]
+    response = client.put(f"/admin/users/{user_id}/role", json={"role": "admin"}, headers=bearer(admin_token))
+    assert response.status_code == 200
+    assert response.json()["role"] == "admin"
+
+    admin_id = client.get("/me", headers=bearer(admin_token)).json()["id"]
+    response = client.put(f"/admin/users/{admin_id}/role", json={"role": "user"}, headers=bearer(admin_token))
+    assert response.status_code == 400
@@ -0,0 +1,67 @@
+import uuid
+
+import search
+from conftest import bearer
+
+
+def _search(client, token: str, **params):
+    response = client.get("/admin/users/search", params=params, headers=bearer(token))
+    assert response.status_code == 200, response.text
+    return [user["username"] for user in response.json()]
+
+
+def _signup(client, username: str, email: str):
+    response = client.post("/signup", json={"username": username, "email": email, "password": "pw-123456"})
+    assert response.status_code == 200, response.text
+
+
+def test_search_index_is_enabled(client):
+    assert search._fts_enabled
+
+
+def test_exact_username_comes_first(client, admin_token):
+    base = f"srch{uuid.uuid4().hex[:8]}"
+    for suffix in ("aa", "", "b"):
+        _signup(client, base + suffix, f"{base}{suffix}@example.com")
+
+    results = _search(client, admin_token, q=base)
+    assert results[0] == base
+    assert sorted(results[1:]) == [base + "aa", base + "b"]
+
+
+def test_exact_email_comes_first(client, admin_token):
+    base = f"mail{uuid.uuid4().hex[:8]}"
+    _signup(client, f"{base}x", f"{base}@example.com")
+    _signup(client, base, f"{base}-other@example.com")
+
+    assert _search(client, admin_token, q=f"{base}@example.com")[0] == f"{base}x"
+
+
+def test_pages_do_not_repeat_the_exact_match(client, admin_token):
+    base = f"page{uuid.uuid4().hex[:8]}"
+    for i in range(5):
+        _signup(client, f"{base}{i}", f"{base}{i}@example.com")
+    _signup(client, base, f"{base}@example.com")
+
+    everything = _search(client, admin_token, q=base, limit=10)
+    assert everything[0] == base and sorted(everything) == sorted([base] + [f"{base}{i}" for i in range(5)])
+    pages = [_search(client, admin_token, q=base, limit=2, offset=offset) for offset in (0, 2, 4)]
+    assert sum(pages, []) == everything
+
+
+def test_search_filters_by_provider(client, admin_token):
+    base = f"prov{uuid.uuid4().hex[:8]}"
+    _signup(client, base, f"{base}@example.com")
+    assert _search(client, admin_token, q=base, auth_provider="local") == [base]
+    assert _search(client, admin_token, q=base, auth_provider="google") == []
+
+
+def test_search_input_cannot_inject_query_syntax(client, admin_token):
+    assert _search(client, admin_token, q='" OR * NEAR(') == []
+    assert _search(client, admin_token, q="x", auth_provider='local" OR "google') == []
+
+
+def test_search_requires_an_admin(client, new_user):
+    _, tokens = new_user()
+    response = client.get("/admin/users/search", params={"q": "a"}, headers=bearer(tokens["access_token"]))
+    assert response.status_code == 403
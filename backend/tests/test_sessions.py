@@ -0,0 +1,63 @@
+from conftest import bearer
+
+
+def _refresh(client, refresh_token: str):
+    return client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+def test_login_returns_a_refresh_token(client, new_user):
+    _, tokens = new_user()
+    assert tokens["token_type"] == "bearer"
+    assert tokens["refresh_token"]
+
+
+def test_refresh_rotates_the_refresh_token(client, new_user):
+    username, tokens = new_user()
+    response = _refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    me = client.get("/me", headers=bearer(rotated["access_token"]))
+    assert me.status_code == 200
+    assert me.json()["username"] == username
+    # Still one signed-in device: the rotation replaced the old session
+    sessions = client.get("/sessions", headers=bearer(rotated["access_token"])).json()
+    assert len(sessions) == 1
+
+
+def test_reusing_a_rotated_token_revokes_the_whole_login(client, new_user):
+    _, tokens = new_user()
+    rotated = _refresh(client, tokens["refresh_token"]).json()
+
+    reused = _refresh(client, tokens["refresh_token"])
+    assert reused.status_code == 401
+    assert "reuse" in reused.json()["detail"]
+    # The attacker's copy and the legitimate client's newer token both stop working
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+
+
+def test_unknown_refresh_token_is_rejected(client):
+    assert _refresh(client, "not-a-refresh-token").status_code == 401
+
+
+def test_logout_with_refresh_token_ends_the_login(client, new_user):
+    _, tokens = new_user()
+    response = client.post(
+        "/logout", json={"refresh_token": tokens["refresh_token"]}, headers=bearer(tokens["access_token"])
+    )
+    assert response.status_code == 200
+    assert _refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_revoking_a_session_from_the_device_list(client, new_user):
+    username, first = new_user()
+    second = client.post("/login", json={"username": username, "password": "pw-123456"}).json()
+    headers = bearer(second["access_token"])
+    sessions = client.get("/sessions", headers=headers).json()
+    assert len(sessions) == 2
+
+    oldest = min(sessions, key=lambda session: session["id"])
+    assert client.delete(f"/sessions/{oldest['id']}", headers=headers).status_code == 200
+    assert _refresh(client, first["refresh_token"]).status_code == 401
+    assert _refresh(client, second["refresh_token"]).status_code == 200
@@ -0,0 +1,77 @@
+import uuid
+
+import json
+
+import pytest
+from sqlalchemy import func
+
+import auth
+import stats
+from conftest import bearer, user_id
+from database import SessionLocal, User, UserCounter
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+
+def _counted(db) -> dict:
+    """What rebuild_counters would compute from the users table"""
+    total = db.query(func.count(User.id)).scalar()
+    active = db.query(func.count(User.id)).filter(User.is_active == True).scalar()
+    return {"total_users": total, "active_users": active, "inactive_users": total - active}
+
+
+def _stats(client, admin_token: str) -> dict:
+    response = client.get("/admin/stats", headers=bearer(admin_token))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_counters_follow_every_kind_of_write(client, db, new_user, admin_token):
+    admin = bearer(admin_token)
+    ids = [user_id(client, new_user()[1]["access_token"]) for _ in range(4)]
+    writes = [
+        client.put(f"/admin/users/{ids[0]}/status", json={"is_active": False}, headers=admin),
+        # Setting the same status again must not count twice
+        client.put(f"/admin/users/{ids[0]}/status", json={"is_active": False}, headers=admin),
+        client.delete(f"/admin/users/{ids[1]}", headers=admin),
+        client.post("/admin/users/bulk/status", json={"ids": ids[2:], "is_active": False}, headers=admin),
+        client.post("/admin/users/bulk/delete", json={"ids": ids[3:]}, headers=admin),
+    ]
+    name = f"st{uuid.uuid4().hex[:8]}"
+    row = {"username": name, "email": f"{name}@example.com", "is_active": False,
+           "hashed_password": auth.get_password_hash("pw-123456")}
+    writes.append(client.post(
+        "/admin/users/import?format=ndjson", files={"file": ("u.ndjson", json.dumps(row))}, headers=admin
+    ))
+    assert all(response.status_code == 200 for response in writes)
+
+    result = _stats(client, admin_token)
+    assert {key: result[key] for key in ("total_users", "active_users", "inactive_users")} == _counted(db)
+    assert sum(result["by_auth_provider"].values()) == result["total_users"]
+
+
+def test_adjust_updates_existing_counters_and_creates_missing_ones(db):
+    provider = f"provider:test-{uuid.uuid4().hex[:8]}"
+    before = {c.name: c.value for c in db.query(UserCounter)}
+    stats.adjust(db, {"total": 2, "active": -1, provider: 3, "unchanged": 0})
+
+    after = {c.name: c.value for c in db.query(UserCounter)}
+    assert after["total"] == before["total"] + 2
+    assert after["active"] == before["active"] - 1
+    assert after[provider] == 3
+    assert "unchanged" not in after
+
+
+def test_rebuild_matches_the_maintained_counters(client, db, admin_token):
+    maintained = {c.name: c.value for c in db.query(UserCounter)}
+    stats.rebuild_counters(db)
+    db.flush()
+    assert {c.name: c.value for c in db.query(UserCounter) if c.value} == {
+        name: value for name, value in maintained.items() if value
+    }
@@ -0,0 +1,72 @@
+import time
+
+from conftest import bearer, user_id
+from user_cache import PrincipalCache, user_cache
+
+
+def _set_status(client, admin_token: str, target: int, is_active: bool):
+    response = client.put(
+        f"/admin/users/{target}/status", json={"is_active": is_active}, headers=bearer(admin_token)
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_repeat_requests_are_served_from_the_cache(client, new_user):
+    _, tokens = new_user()
+    headers = bearer(tokens["access_token"])
+    client.get("/me", headers=headers)
+    hits = user_cache.hits
+    assert client.get("/me", headers=headers).status_code == 200
+    assert user_cache.hits == hits + 1
+
+
+def test_deactivation_takes_effect_at_once(client, new_user, admin_token):
+    _, tokens = new_user()
+    headers = bearer(tokens["access_token"])
+    target = user_id(client, tokens["access_token"])
+
+    _set_status(client, admin_token, target, False)
+    assert client.get("/me", headers=headers).status_code == 403
+    _set_status(client, admin_token, target, True)
+    assert client.get("/me", headers=headers).status_code == 200
+
+
+def test_bulk_deactivation_takes_effect_at_once(client, new_user, admin_token):
+    _, tokens = new_user()
+    headers = bearer(tokens["access_token"])
+    target = user_id(client, tokens["access_token"])
+
+    response = client.post(
+        "/admin/users/bulk/status", json={"ids": [target], "is_active": False}, headers=bearer(admin_token)
+    )
+    assert response.status_code == 200, response.text
+    assert client.get("/me", headers=headers).status_code == 403
+
+
+def test_entries_expire_after_the_ttl():
+    cache = PrincipalCache(max_size=10, ttl=0.05)
+    cache.set("bob", "token", object())
+    assert cache.get("bob", "token") is not None
+    time.sleep(0.06)
+    assert cache.get("bob", "token") is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = PrincipalCache(max_size=2, ttl=60)
+    cache.set("a", "t", "user-a")
+    cache.set("b", "t", "user-b")
+    cache.get("a", "t")
+    cache.set("c", "t", "user-c")
+    assert cache.get("b", "t") is None
+    assert cache.get("a", "t") == "user-a"
+    assert cache.evictions == 1
+
+
+def test_invalidate_drops_every_token_of_the_user():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.set("bob", "phone", "bob")
+    cache.set("bob", "laptop", "bob")
+    cache.set("alice", "phone", "alice")
+    cache.invalidate("bob")
+    assert cache.get("bob", "phone") is None and cache.get("bob", "laptop") is None
+    assert cache.get("alice", "phone") == "alice"
@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+
+from database import SessionLocal, User
+from google_oauth import GoogleOAuth
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+
+def _base() -> str:
+    return f"g{uuid.uuid4().hex[:10]}"
+
+
+def _add(db, *usernames):
+    for username in usernames:
+        db.add(User(username=username, email=f"{username}@example.com", hashed_password=None))
+    db.flush()
+
+
+def test_free_base_is_used_as_is(db):
+    base = _base()
+    assert GoogleOAuth.allocate_username(db, f"{base}@gmail.com") == base
+
+
+def test_email_is_reduced_to_alphanumerics(db):
+    base = _base()
+    assert GoogleOAuth.allocate_username(db, f"{base[:5]}.{base[5:]}+tag@gmail.com") == f"{base[:5]}{base[5:]}tag"
+
+
+def test_taken_base_gets_the_next_number(db):
+    base = _base()
+    _add(db, base)
+    assert GoogleOAuth.allocate_username(db, f"{base}@gmail.com") == f"{base}1"
+    _add(db, f"{base}1", f"{base}2", f"{base}10")
+    assert GoogleOAuth.allocate_username(db, f"{base}@gmail.com") == f"{base}11"
+
+
+def test_other_names_sharing_the_prefix_are_ignored(db):
+    base = _base()
+    _add(db, base, f"{base}x", f"{base}07", f"{base}a9")
+    assert GoogleOAuth.allocate_username(db, f"{base}@gmail.com") == f"{base}1"
+
+
+def test_allocated_name_is_free(db):
+    base = _base()
+    _add(db, base, f"{base}3", f"{base}5x")
+    username = GoogleOAuth.allocate_username(db, f"{base}@gmail.com")
+    assert db.query(User).filter(User.username == username).first() is None
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from config import get_settings
+
+settings = get_settings()
+
+# Principal cache settings
+USER_CACHE_SIZE = settings.user_cache_size
+USER_CACHE_TTL_SECONDS = settings.user_cache_ttl_seconds
+
+
+class PrincipalCache:
+    """LRU/TTL cache of users resolved from bearer tokens.
+
+    Entries are keyed by (username, token) and hold detached User rows.
+    Invalidation is per process, so with several workers a change made
+    through another worker is picked up at the latest after the TTL.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens_by_username = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, username: str, token: str):
+        key = (username, token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def set(self, username: str, token: str, user):
+        if self.max_size <= 0:
+            return
+        key = (username, token)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._tokens_by_username.setdefault(username, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, username: str):
+        """Drop every cached token for a user"""
+        with self._lock:
+            tokens = self._tokens_by_username.pop(username, ())
+            for token in tokens:
+                self._entries.pop((username, token), None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_username.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        username, token = key
+        tokens = self._tokens_by_username.get(username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_username[username]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = PrincipalCache()
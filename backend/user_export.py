@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from typing import Iterator, Optional
+
+import pagination
+from database import SessionLocal, User
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.is_active,
+    User.auth_provider,
+    User.role,
+    User.google_id,
+    User.profile_picture,
+    User.created_at,
+    User.last_login,
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def iter_export(fmt: str, is_active: Optional[bool] = None, auth_provider: Optional[str] = None,
+                prefix: Optional[str] = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """Stream users as NDJSON or CSV text chunks in constant memory.
+
+    Rows are fetched as plain tuples from a server-side cursor, one chunk at
+    a time, and written out without building ORM or Pydantic objects. The
+    generator owns its session because it outlives the request handler.
+    """
+    # Password hashes are never exported
+    columns = EXPORT_COLUMNS
+    names = [column.key for column in columns]
+    db = SessionLocal()
+    try:
+        query = pagination.filter_users(db.query(*columns), is_active, auth_provider, prefix)
+        query = query.order_by(User.id).execution_options(stream_results=True).yield_per(chunk_size)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(names)
+        pending = 0
+        for row in query:
+            values = [_plain(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(names, values)), separators=(",", ":")))
+                buffer.write("\n")
+            pending += 1
+            if pending >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
@@ -8,6 +8,7 @@ export interface User {
   google_id?: string;
   profile_picture?: string;
   auth_provider?: string;
+  role?: string;
 }
 
 export interface UserCreate {
@@ -34,7 +34,7 @@ export class AuthService {
   }
 
   logout(): Observable<any> {
-    return this.http.post(`${this.apiUrl}/logout`, {}).pipe(
+    return this.http.post(`${this.apiUrl}/logout`, {}, { headers: this.getAuthHeaders() }).pipe(
       tap(() => {
         localStorage.removeItem('token');
         this.currentUserSubject.next(null);
@@ -107,7 +107,7 @@ export class AuthService {
   // Check if current user is admin
   isAdmin(): boolean {
     const currentUser = this.currentUserSubject.value;
-    return currentUser && (currentUser.id === 1 || currentUser.username.toLowerCase() === 'admin');
+    return !!currentUser && currentUser.role === 'admin';
   }
 
   // Google SSO methods
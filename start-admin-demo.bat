@@ -20,8 +20,8 @@ echo Backend API: http://localhost:8000
 echo Frontend: http://localhost:4200
 echo.
 echo To test admin features:
-echo 1. Sign up with username 'admin' 
-echo 2. Or use the first user you create (ID = 1)
+echo 1. Sign up: the first user you create (ID = 1) is the admin
+echo 2. Grant more admins with: python migrate_db.py --grant-admin USERNAME
 echo 3. Login and you'll see the Admin Dashboard button
 echo.
 echo Admin endpoints available: